@@ -1,9 +1,6 @@
 from src.ENDTOENDDSPROJECT.logger import logging
 from src.ENDTOENDDSPROJECT.exception import CustomException
-from src.ENDTOENDDSPROJECT.components.data_ingestion import DataIngestion
-from src.ENDTOENDDSPROJECT.components.data_ingestion import DataIngestionConfig
-from src.ENDTOENDDSPROJECT.components.data_transformation import DataTransformationConfig,DataTransformation
-from src.ENDTOENDDSPROJECT.components.model_tranier import ModelTrainerConfig,ModelTrainer
+from src.ENDTOENDDSPROJECT.pipelines.training_pipeline import TrainingPipeline
 
 import sys
 
@@ -12,19 +9,13 @@ if __name__=="__main__":
     logging.info("The execution has started")
 
     try:
-        #data_ingestion_config=DataIngestionConfig()
-        data_ingestion=DataIngestion()
-        train_data_path,test_data_path=data_ingestion.initiate_data_ingestion()
+        ## Ingestion, transformation, training and evaluation run as cached
+        ## stages; unchanged stages are restored and a failed run resumes
+        ## at the stage that failed
+        results=TrainingPipeline().run()
+        for stage,status in results.items():
+            print(f"{stage}: {status}")
 
-        #data_transformation_config=DataTransformationConfig()
-        data_transformation=DataTransformation()
-        train_arr,test_arr,_=data_transformation.initiate_data_transformation(train_data_path,test_data_path)
-
-        ## Model Training
-
-        model_trainer=ModelTrainer()
-        print(model_trainer.initiate_model_trainer(train_arr,test_arr))
-        
     except Exception as e:
         logging.info("Custom Exception")
         raise CustomException(e,sys)
@@ -1,13 +1,81 @@
-from flask import Flask, request, render_template
-import numpy as np
-import pandas as pd
+import os
+import shutil
+import tempfile
+import threading
+import time
 
-from sklearn.preprocessing import StandardScaler
-from src.ENDTOENDDSPROJECT.pipelines.prediction_pipeline import CustomData, PredictPipeline
+from flask import Flask, request, render_template, jsonify, Response
+
+from src.ENDTOENDDSPROJECT.pipelines.prediction_pipeline import (
+    CustomData, PredictPipeline, MicroBatchPredictor, PredictionCache
+)
+from src.ENDTOENDDSPROJECT.components.model_monitering import DriftMonitor
+from src.ENDTOENDDSPROJECT.components.prediction_logger import PredictionLogger
+from src.ENDTOENDDSPROJECT.logger import logging
 
 application = Flask(__name__)
 app = application
 
+# shared by all requests; the loaded artifacts are cached process-wide
+predict_pipeline = PredictPipeline()
+# PREDICT_MICRO_BATCHING=1 scores concurrent form/API requests together
+micro_batcher = MicroBatchPredictor(predict_pipeline) if os.getenv("PREDICT_MICRO_BATCHING", "0") == "1" else None
+# repeated samples are answered from an LRU/TTL cache, PREDICT_CACHE=0 turns it off
+prediction_cache = (PredictionCache(micro_batcher or predict_pipeline, predict_pipeline)
+                    if os.getenv("PREDICT_CACHE", "1") == "1" else None)
+# outermost, so cache hits count towards the input distribution too;
+# DRIFT_MONITOR=0 turns it off
+drift_monitor = (DriftMonitor(prediction_cache or micro_batcher or predict_pipeline, predict_pipeline)
+                 if os.getenv("DRIFT_MONITOR", "1") == "1" else None)
+# every prediction is queued for the append-only Parquet log, written by a
+# background thread; PREDICTION_LOG=0 turns it off
+prediction_logger = (PredictionLogger(drift_monitor or prediction_cache or micro_batcher or predict_pipeline,
+                                      predict_pipeline)
+                     if os.getenv("PREDICTION_LOG", "1") == "1" else None)
+if prediction_logger is not None:
+    prediction_logger.start()
+predictor = prediction_logger or drift_monitor or prediction_cache or micro_batcher or predict_pipeline
+
+FERTILITY_MAPPING = {0: "Low Fertility", 1: "Medium Fertility", 2: "High Fertility"}
+
+# the district and soil type options of templates/home.html
+DISTRICTS = ["Ajmer", "Alwar", "Bhilwara", "Hanumangarh", "Jaipur", "Jodhpur", "Nagaur",
+             "Sri Ganganagar", "Udaipur"]
+SOIL_TYPES = ["Alkaline", "Black lava soil", "Chalky (Calcareous)", "Clay", "Loamy", "Nitrogenous",
+              "Saline", "Sandy"]
+
+warmup_status = {"state": "warming up", "error": None, "seconds": None}
+
+def warmup():
+    """Load the artifacts and score synthetic samples so the first real request is not cold"""
+    started = time.perf_counter()
+    try:
+        # predict loads only what it scores with: the compiled model when it
+        # is current, otherwise the sklearn pickles
+        samples = [
+            CustomData(district=district, soil_type=SOIL_TYPES[index % len(SOIL_TYPES)], ph_level=7.0,
+                       organic_matter=2.0, nitrogen_content=30.0, phosphorus_content=20.0, potassium_content=40.0)
+            for index, district in enumerate(DISTRICTS)
+        ]
+        records = [sample.get_data_as_dict() for sample in samples]
+        # the batch, single-row and CSV (DataFrame) scoring paths; straight
+        # to the pipeline so synthetic samples stay out of the result cache
+        predict_pipeline.predict(records)
+        predict_pipeline.predict(records[:1])
+        predict_pipeline.predict(CustomData.get_batch_as_data_frame(samples))
+        if micro_batcher is not None:
+            micro_batcher.start()
+        if drift_monitor is not None:
+            drift_monitor.load_reference()
+
+        warmup_status.update(state="ready", seconds=round(time.perf_counter() - started, 3))
+        logging.info("Warmup finished in %ss", warmup_status["seconds"])
+    except Exception as e:
+        warmup_status.update(state="failed", error=str(e))
+        logging.error("Warmup failed: %s", e)
+
+threading.Thread(target=warmup, name="warmup", daemon=True).start()
+
 def get_suggestions(prediction_value, input_data):
     """Generate actionable suggestions based on prediction and input parameters"""
     suggestions = {
@@ -92,18 +160,12 @@ def predict_datapoint():
             phosphorus_content=float(request.form.get('phosphorus_content')),
             potassium_content=float(request.form.get('potassium_content'))
         )
-        pred_df = data.get_data_as_data_frame()
-        print(pred_df)
-        print("Before Prediction")
-
-        predict_pipeline = PredictPipeline()
-        print("Mid Prediction")
-        results = predict_pipeline.predict(pred_df)
-        print("After Prediction")
+        features = [data.get_data_as_dict()]
+        logging.debug("Predicting %s", features)
+        results = predictor.predict(features)
         
         # Convert fertility status to readable format
-        fertility_mapping = {0: "Low Fertility", 1: "Medium Fertility", 2: "High Fertility"}
-        fertility_status = fertility_mapping.get(results[0], "Unknown")
+        fertility_status = FERTILITY_MAPPING.get(results[0], "Unknown")
         
         # Generate suggestions based on prediction
         suggestions = get_suggestions(results[0], data)
@@ -122,7 +184,115 @@ def predict_datapoint():
                              model_info=model_info,
                              input_data=data)
 
+@app.route('/api/v1/predict', methods=['POST'])
+def predict_batch():
+    samples = request.get_json(silent=True)
+    if not isinstance(samples, list) or not samples:
+        return jsonify({"error": "Expected a non-empty JSON array of soil samples"}), 400
+
+    try:
+        data = [CustomData.from_dict(sample) for sample in samples]
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid soil sample: {e}"}), 400
+
+    # one transform + predict call for the whole batch
+    results = predictor.predict([sample.get_data_as_dict() for sample in data])
+
+    predictions = []
+    for value, sample in zip(results, data):
+        predictions.append({
+            "prediction": float(value),
+            "fertility_status": FERTILITY_MAPPING.get(value, "Unknown"),
+            "suggestions": get_suggestions(value, sample)
+        })
+
+    return jsonify({"predictions": predictions})
+
+@app.route('/api/v1/predict/csv', methods=['POST'])
+def predict_csv():
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({"error": "Expected a CSV upload in the 'file' field"}), 400
+
+    output_format = request.args.get('format', 'csv')
+    if output_format not in ('csv', 'ndjson'):
+        return jsonify({"error": "format must be 'csv' or 'ndjson'"}), 400
+
+    # memory per request is bounded by the chunk size, so it is capped
+    chunk_size = request.args.get('chunk_size', type=int)
+    max_chunk_size = predict_pipeline.predict_pipeline_config.max_csv_chunk_size
+    if chunk_size is not None and not 1 <= chunk_size <= max_chunk_size:
+        return jsonify({"error": f"chunk_size must be between 1 and {max_chunk_size}"}), 400
+
+    # the upload is closed with the request, before the streamed body is
+    # consumed, so spool it to a temp file the generator owns
+    upload_file = tempfile.TemporaryFile()
+    shutil.copyfileobj(upload.stream, upload_file)
+    upload_file.seek(0)
+
+    chunks = predict_pipeline.predict_csv_in_chunks(upload_file, chunk_size)
+    version = predict_pipeline.get_artifact_version() if prediction_logger is not None else None
+
+    # score the first chunk up front so a malformed file still gets a 400
+    try:
+        started = time.perf_counter()
+        first = next(chunks, None)
+    except Exception as e:
+        upload_file.close()
+        return jsonify({"error": f"Could not score upload: {e}"}), 400
+
+    def generate():
+        try:
+            header = True
+            current = first
+            scoring_started = started
+            while current is not None:
+                chunk, results = current
+                if prediction_logger is not None:
+                    prediction_logger.log(chunk, results, (time.perf_counter() - scoring_started) * 1000, version)
+                if drift_monitor is not None:
+                    drift_monitor.observe(chunk)
+                chunk = chunk.drop(columns=["Fertility Status"], errors="ignore")
+                chunk["prediction"] = results
+                chunk["fertility_status"] = [FERTILITY_MAPPING.get(value, "Unknown") for value in results]
+
+                if output_format == 'ndjson':
+                    yield chunk.to_json(orient='records', lines=True).rstrip("\n") + "\n"
+                else:
+                    yield chunk.to_csv(index=False, header=header)
+                header = False
+                scoring_started = time.perf_counter()
+                current = next(chunks, None)
+        finally:
+            upload_file.close()
+
+    mimetype = 'application/x-ndjson' if output_format == 'ndjson' else 'text/csv'
+    return Response(generate(), mimetype=mimetype)
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    # liveness only: the process is up and serving, warm or not
+    return jsonify({"status": "ok"})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    # load balancers should only route here once warmup succeeded
+    status_code = 200 if warmup_status["state"] == "ready" else 503
+    return jsonify(warmup_status), status_code
+
+@app.route('/api/v1/metrics', methods=['GET'])
+def prediction_metrics():
+    metrics = {"micro_batching": micro_batcher is not None}
+    if micro_batcher is not None:
+        metrics.update(micro_batcher.metrics())
+    if prediction_cache is not None:
+        metrics["prediction_cache"] = prediction_cache.metrics()
+    if drift_monitor is not None:
+        metrics["drift"] = drift_monitor.snapshot()
+    if prediction_logger is not None:
+        metrics["prediction_log"] = prediction_logger.metrics()
+    return jsonify(metrics)
+
 if __name__ == "__main__":
-    import os
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port, debug=False)
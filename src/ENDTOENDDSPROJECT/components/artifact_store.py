@@ -0,0 +1,139 @@
+import json
+import os
+import shutil
+import sys
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+
+from src.ENDTOENDDSPROJECT.exception import CustomException
+from src.ENDTOENDDSPROJECT.logger import logging
+from src.ENDTOENDDSPROJECT.utils import compute_file_hash, load_object_cached
+
+
+@dataclass
+class ArtifactStoreConfig:
+    store_dir: str = os.getenv("ARTIFACT_STORE_DIR", os.path.join('artifacts', 'model_store'))
+    # published runs kept on disk besides the current one
+    keep_runs: int = 5
+
+class ArtifactStore:
+    '''
+    Versioned store for the serving artifacts. Every publish copies the files
+    into a new, never modified runs/<run_id>/ directory together with a
+    bundle.json of their checksums, then swaps the CURRENT pointer file with
+    os.replace. Readers follow CURRENT to one run directory, so they always
+    get a model and preprocessor from the same run and never see a partially
+    written file, without any locking.
+    '''
+    BUNDLE_NAME = "bundle.json"
+    POINTER_NAME = "CURRENT"
+
+    def __init__(self, config=None):
+        self.artifact_store_config = config or ArtifactStoreConfig()
+        self.runs_dir = os.path.join(self.artifact_store_config.store_dir, "runs")
+        self.pointer_path = os.path.join(self.artifact_store_config.store_dir, self.POINTER_NAME)
+
+    @staticmethod
+    def _fsync_write(path, data):
+        with open(path, "w") as file_obj:
+            file_obj.write(data)
+            file_obj.flush()
+            os.fsync(file_obj.fileno())
+
+    def get_current_run_id(self):
+        if not os.path.exists(self.pointer_path):
+            return None
+        with open(self.pointer_path) as file_obj:
+            return file_obj.read().strip() or None
+
+    def read_bundle(self, run_id, verify=True):
+        '''
+        Returns {"run_id", "created_at", "metadata", "files": {name: {"path",
+        "sha256"}}} for a published run, checking every file against its
+        recorded checksum first when verify is set.
+        '''
+        run_dir = os.path.join(self.runs_dir, run_id)
+        with open(os.path.join(run_dir, self.BUNDLE_NAME)) as file_obj:
+            bundle = json.load(file_obj)
+
+        for name, entry in bundle["files"].items():
+            entry["path"] = os.path.join(run_dir, entry["file"])
+            if verify and compute_file_hash(entry["path"]) != entry["sha256"]:
+                raise ValueError(f"Checksum mismatch for {name} in run {run_id}")
+        return bundle
+
+    @staticmethod
+    def _read_pointed_bundle(pointer_path):
+        # static, so the object cache key is the pointer path and not the store instance
+        with open(pointer_path) as file_obj:
+            run_id = file_obj.read().strip()
+        store = ArtifactStore(ArtifactStoreConfig(store_dir=os.path.dirname(pointer_path)))
+        return store.read_bundle(run_id)
+
+    def load_current_bundle(self):
+        '''
+        The bundle CURRENT points at, or None when nothing was published yet.
+        It is read and verified once per pointer swap and cached after that.
+        '''
+        try:
+            if not os.path.exists(self.pointer_path):
+                return None
+            return load_object_cached(self.pointer_path, loader=self._read_pointed_bundle)
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def activate(self, run_id):
+        # verify before pointing readers at it, also used to roll back
+        self.read_bundle(run_id)
+        tmp_path = f"{self.pointer_path}.tmp-{os.getpid()}"
+        self._fsync_write(tmp_path, run_id)
+        os.replace(tmp_path, self.pointer_path)
+        logging.info("Artifact store now serves run %s", run_id)
+
+    def publish(self, files, metadata=None):
+        '''
+        Publishes {name: path} as one bundle and makes it current. Publishing
+        the same file contents as the current bundle is a no-op.
+        '''
+        try:
+            checksums = {name: compute_file_hash(path) for name, path in files.items()}
+            current_run_id = self.get_current_run_id()
+            if current_run_id is not None:
+                current = self.read_bundle(current_run_id, verify=False)
+                if {name: entry["sha256"] for name, entry in current["files"].items()} == checksums:
+                    logging.info("Artifacts unchanged, run %s stays current", current_run_id)
+                    return current_run_id
+
+            run_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+            run_dir = os.path.join(self.runs_dir, run_id)
+            tmp_dir = os.path.join(self.runs_dir, f".{run_id}.tmp")
+            os.makedirs(tmp_dir)
+
+            bundle_files = {}
+            for name, path in files.items():
+                file_name = os.path.basename(path)
+                shutil.copyfile(path, os.path.join(tmp_dir, file_name))
+                with open(os.path.join(tmp_dir, file_name), "rb") as file_obj:
+                    os.fsync(file_obj.fileno())
+                bundle_files[name] = {"file": file_name, "sha256": checksums[name]}
+
+            bundle = {"run_id": run_id, "created_at": datetime.now().isoformat(),
+                      "metadata": metadata or {}, "files": bundle_files}
+            self._fsync_write(os.path.join(tmp_dir, self.BUNDLE_NAME), json.dumps(bundle, indent=2))
+
+            os.replace(tmp_dir, run_dir)
+            self.activate(run_id)
+            self.prune()
+            return run_id
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def prune(self):
+        current_run_id = self.get_current_run_id()
+        run_ids = sorted(name for name in os.listdir(self.runs_dir) if not name.startswith("."))
+        old_run_ids = [run_id for run_id in run_ids if run_id != current_run_id]
+        for run_id in old_run_ids[:max(0, len(old_run_ids) - self.artifact_store_config.keep_runs)]:
+            shutil.rmtree(os.path.join(self.runs_dir, run_id), ignore_errors=True)
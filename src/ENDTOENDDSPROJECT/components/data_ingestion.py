@@ -1,13 +1,20 @@
+import hashlib
+import io
+import json
 import os
 import sys
 from src.ENDTOENDDSPROJECT.exception import CustomException
 from src.ENDTOENDDSPROJECT.logger import logging
 import pandas as pd
-from src.ENDTOENDDSPROJECT.utils import read_sql_data
+from src.ENDTOENDDSPROJECT.utils import (
+    read_sql_data_chunks, write_dataset, append_dataset, DatasetWriter, get_sql_connection_pool,
+    compute_fingerprint, get_dataset_parts
+)
 
 from sklearn.model_selection import train_test_split
 
 from dataclasses import dataclass
+from typing import Optional
 
 
 @dataclass
@@ -15,23 +22,261 @@ class DataIngestionConfig:
     train_data_path:str=os.path.join('artifacts','train.csv')
     test_data_path:str=os.path.join('artifacts','test.csv')
     raw_data_path:str=os.path.join('artifacts','raw.csv')
+    # "csv", "parquet" or "feather"; the columnar formats keep dtypes and
+    # store the categorical columns as categoricals
+    artifact_format:str=os.getenv("ARTIFACT_FORMAT","csv")
+    categorical_columns:tuple=('District','Soil Type')
+    # "csv" reads source_data_path, "sql" streams the table below
+    source:str=os.getenv("INGESTION_SOURCE","csv")
+    source_data_path:str=os.path.join('notebook','data','raw.csv')
+    sql_table:str="students"
+    sql_chunk_size:int=10000
+    test_size:float=0.2
+    # incremental mode only reads rows added since the last run and appends
+    # them to the splits; sql_key_column is the increasing key (id or
+    # timestamp) used as the SQL watermark
+    incremental:bool=os.getenv("INGESTION_INCREMENTAL","0")=="1"
+    watermark_path:str=os.path.join('artifacts','ingestion_watermark.json')
+    sql_key_column:Optional[str]=None
+    # columns hashed to place a row in train or test, None hashes the whole row
+    row_key_columns:Optional[tuple]=None
+
+    def __post_init__(self):
+        if self.artifact_format != "csv":
+            for name in ("train_data_path", "test_data_path", "raw_data_path"):
+                root, _ = os.path.splitext(getattr(self, name))
+                setattr(self, name, f"{root}.{self.artifact_format}")
 
 class DataIngestion:
-    def __init__(self):
+    # bytes before the watermark offset that must be unchanged to resume
+    WATERMARK_TAIL_BYTES=4096
+
+    def __init__(self,connection_pool=None):
         self.ingestion_config=DataIngestionConfig()
+        # defaults to the pooled MySQL connection from .env
+        self.connection_pool=connection_pool
+
+    def initiate_sql_ingestion(self):
+        '''
+        Streams the SQL table in chunks straight into the raw/train/test
+        artifacts, so peak memory is one chunk whatever the table size. Rows
+        are placed with assign_test_rows, so the split does not depend on the
+        order the database returns them in.
+        '''
+        config=self.ingestion_config
+        os.makedirs(os.path.dirname(config.train_data_path),exist_ok=True)
+
+        with DatasetWriter(config.raw_data_path,config.categorical_columns) as raw_writer, \
+                DatasetWriter(config.train_data_path,config.categorical_columns) as train_writer, \
+                DatasetWriter(config.test_data_path,config.categorical_columns) as test_writer:
+            chunks=read_sql_data_chunks(f"SELECT * FROM {config.sql_table}",
+                                        chunk_size=config.sql_chunk_size,pool=self.connection_pool)
+            for chunk in chunks:
+                is_test=self.assign_test_rows(chunk)
+                raw_writer.write(chunk)
+                train_writer.write(chunk[~is_test])
+                test_writer.write(chunk[is_test])
+
+        logging.info("Streamed %s rows from %s",raw_writer.rows_written,config.sql_table)
+
+    def assign_test_rows(self,df):
+        '''
+        Deterministic split: a row goes to test when the hash of its key falls
+        in the lowest test_size share of the hash space, so a row keeps its
+        split no matter when or alongside which other rows it is ingested.
+        '''
+        key_columns=self.ingestion_config.row_key_columns
+        keys=df if key_columns is None else df[list(key_columns)]
+        hashes=pd.util.hash_pandas_object(keys,index=False).to_numpy()
+        return (hashes%10000)<self.ingestion_config.test_size*10000
+
+    def get_watermark_fingerprint(self):
+        # a watermark only applies to the settings it was recorded with
+        config=self.ingestion_config
+        return compute_fingerprint(
+            config.source,
+            config.source_data_path if config.source=="csv" else config.sql_table,
+            config.sql_key_column,
+            config.row_key_columns,
+            config.test_size,
+            config.artifact_format
+        )
+
+    def get_split_signatures(self):
+        '''
+        Size and tail hash of every file of the raw/train/test splits. Reads
+        at most WATERMARK_TAIL_BYTES per file, so checking the splits does
+        not grow with their history.
+        '''
+        config=self.ingestion_config
+        signatures={}
+        for path in (config.raw_data_path,config.train_data_path,config.test_data_path):
+            signatures[path]=None
+            if os.path.exists(path):
+                signatures[path]=[]
+                for part in get_dataset_parts(path):
+                    size=os.path.getsize(part)
+                    with open(part,"rb") as file_obj:
+                        signatures[path].append([os.path.basename(part),size,self._tail_hash(file_obj,size)])
+        return signatures
+
+    def load_watermark(self):
+        path=self.ingestion_config.watermark_path
+        if not os.path.exists(path):
+            return None
+        with open(path) as file_obj:
+            watermark=json.load(file_obj)
+        if watermark.get("fingerprint")!=self.get_watermark_fingerprint():
+            logging.info("Ingestion settings changed since the last watermark, re-ingesting everything")
+            return None
+        # appending to splits deleted or rewritten since (a full run, a
+        # manual cleanup) would lose history or mix two split schemes
+        if watermark.get("splits")!=self.get_split_signatures():
+            logging.info("Splits changed since the last watermark, re-ingesting everything")
+            return None
+        return watermark
+
+    def save_watermark(self,watermark):
+        path=self.ingestion_config.watermark_path
+        watermark["fingerprint"]=self.get_watermark_fingerprint()
+        # the splits this watermark was recorded for
+        watermark["splits"]=self.get_split_signatures()
+        tmp_path=f"{path}.tmp"
+        with open(tmp_path,"w") as file_obj:
+            json.dump(watermark,file_obj,indent=2)
+        os.replace(tmp_path,path)
+
+    def remove_watermark(self):
+        # a full ingestion rewrites the splits the watermark was recorded for
+        path=self.ingestion_config.watermark_path
+        if os.path.exists(path):
+            os.remove(path)
+            logging.info("Removed the ingestion watermark %s",path)
+
+    def _tail_hash(self,file_obj,offset):
+        start=max(0,offset-self.WATERMARK_TAIL_BYTES)
+        file_obj.seek(start)
+        return hashlib.sha256(file_obj.read(offset-start)).hexdigest()
+
+    def read_new_csv_rows(self,watermark):
+        '''
+        Parses only the bytes after the recorded offset. The offset is trusted
+        when the file is at least that long and the bytes just before it are
+        unchanged; otherwise the source was rewritten and is read in full.
+        A trailing line without a newline is left for the next run.
+        '''
+        path=self.ingestion_config.source_data_path
+        with open(path,"rb") as file_obj:
+            offset=0
+            if watermark is not None and os.path.getsize(path)>=watermark["offset"] and \
+                    self._tail_hash(file_obj,watermark["offset"])==watermark["tail_hash"]:
+                offset=watermark["offset"]
+
+            file_obj.seek(offset)
+            data=file_obj.read()
+            data=data[:data.rfind(b"\n")+1]
+
+            new_offset=offset+len(data)
+            tail_hash=self._tail_hash(file_obj,new_offset)
+
+        if offset==0:
+            df=pd.read_csv(io.BytesIO(data))
+        elif data:
+            df=pd.read_csv(io.BytesIO(data),header=None,names=watermark["columns"])
+        else:
+            df=pd.DataFrame(columns=watermark["columns"])
+
+        new_watermark={"offset":new_offset,"tail_hash":tail_hash,"columns":list(df.columns)}
+        return [df],offset==0,new_watermark
+
+    def read_new_sql_rows(self,watermark):
+        config=self.ingestion_config
+        if config.sql_key_column is None:
+            raise ValueError("Incremental SQL ingestion needs DataIngestionConfig.sql_key_column")
+
+        pool=self.connection_pool or get_sql_connection_pool()
+        key=config.sql_key_column
+        query=f"SELECT * FROM {config.sql_table}"
+        params=None
+        if watermark is not None:
+            query+=f" WHERE {key} > {pool.placeholder}"
+            params=(watermark["max_key"],)
+        query+=f" ORDER BY {key}"
+
+        chunks=read_sql_data_chunks(query,chunk_size=config.sql_chunk_size,pool=pool,params=params)
+        new_watermark={"max_key":None if watermark is None else watermark["max_key"]}
+
+        def track_max_key():
+            for chunk in chunks:
+                if len(chunk):
+                    max_key=chunk[key].max()
+                    new_watermark["max_key"]=max_key.item() if hasattr(max_key,"item") else str(max_key)
+                yield chunk
+
+        return track_max_key(),watermark is None,new_watermark
+
+    def initiate_incremental_ingestion(self):
+        '''
+        Appends only the rows added since the last recorded watermark. Rows
+        are placed with assign_test_rows, so earlier assignments never move.
+        The watermark is saved after the splits are written, so a crash in
+        between re-ingests that increment on the next run.
+        '''
+        config=self.ingestion_config
+        os.makedirs(os.path.dirname(config.train_data_path),exist_ok=True)
+        watermark=self.load_watermark()
+
+        if config.source=="sql":
+            chunks,full,new_watermark=self.read_new_sql_rows(watermark)
+        else:
+            chunks,full,new_watermark=self.read_new_csv_rows(watermark)
+
+        new_rows=0
+        if full:
+            with DatasetWriter(config.raw_data_path,config.categorical_columns) as raw_writer, \
+                    DatasetWriter(config.train_data_path,config.categorical_columns) as train_writer, \
+                    DatasetWriter(config.test_data_path,config.categorical_columns) as test_writer:
+                for chunk in chunks:
+                    is_test=self.assign_test_rows(chunk)
+                    raw_writer.write(chunk)
+                    train_writer.write(chunk[~is_test])
+                    test_writer.write(chunk[is_test])
+                    new_rows+=len(chunk)
+        else:
+            # gather the increment so columnar splits get one part per run
+            new_chunks=[chunk for chunk in chunks if len(chunk)]
+            if new_chunks:
+                new_df=pd.concat(new_chunks,ignore_index=True)
+                is_test=self.assign_test_rows(new_df)
+                append_dataset(new_df,config.raw_data_path,config.categorical_columns)
+                append_dataset(new_df[~is_test],config.train_data_path,config.categorical_columns)
+                append_dataset(new_df[is_test],config.test_data_path,config.categorical_columns)
+                new_rows=len(new_df)
+
+        new_watermark["rows"]=new_rows+(0 if full else watermark.get("rows",0))
+        self.save_watermark(new_watermark)
+        logging.info("Incremental ingestion added %s rows (full reload: %s)",new_rows,full)
 
     def initiate_data_ingestion(self):
         try:
-            ##reading the data from mysql
-            df=pd.read_csv(os.path.join('notebook/data','raw.csv'))
-            logging.info("Reading completed mysql database")
+            if self.ingestion_config.incremental:
+                self.initiate_incremental_ingestion()
+            elif self.ingestion_config.source=="sql":
+                self.remove_watermark()
+                self.initiate_sql_ingestion()
+            else:
+                self.remove_watermark()
+                ##reading the data from mysql
+                df=pd.read_csv(self.ingestion_config.source_data_path)
+                logging.info("Reading completed mysql database")
 
-            os.makedirs(os.path.dirname(self.ingestion_config.train_data_path),exist_ok=True)
+                os.makedirs(os.path.dirname(self.ingestion_config.train_data_path),exist_ok=True)
 
-            df.to_csv(self.ingestion_config.raw_data_path,index=False,header=True)
-            train_set,test_set=train_test_split(df,test_size=0.2,random_state=42)
-            train_set.to_csv(self.ingestion_config.train_data_path,index=False,header=True)
-            test_set.to_csv(self.ingestion_config.test_data_path,index=False,header=True)
+                categorical_columns=self.ingestion_config.categorical_columns
+                write_dataset(df,self.ingestion_config.raw_data_path,categorical_columns)
+                train_set,test_set=train_test_split(df,test_size=self.ingestion_config.test_size,random_state=42)
+                write_dataset(train_set,self.ingestion_config.train_data_path,categorical_columns)
+                write_dataset(test_set,self.ingestion_config.test_data_path,categorical_columns)
 
             logging.info("Data Ingestion is completed")
 
@@ -44,4 +289,4 @@ class DataIngestion:
 
 
         except Exception as e:
-            raise CustomException(e,sys)
\ No newline at end of file
+            raise CustomException(e,sys)
@@ -1,14 +1,19 @@
+import shutil
 import sys
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import List
 
 import numpy as np
-import pandas as pd
+import sklearn
+from scipy import sparse
 from sklearn.preprocessing import OneHotEncoder, StandardScaler
 from sklearn.compose import ColumnTransformer
 from sklearn.impute import SimpleImputer
 from sklearn.pipeline import Pipeline
 
-from src.ENDTOENDDSPROJECT.utils import save_object
+from src.ENDTOENDDSPROJECT.utils import (
+    save_object, compute_file_hash, compute_fingerprint, describe_estimator, read_dataset
+)
 
 from src.ENDTOENDDSPROJECT.exception import CustomException
 from src.ENDTOENDDSPROJECT.logger import logging
@@ -17,6 +22,23 @@ import os
 @dataclass
 class DataTransformationConfig:
     preprocessor_obj_file_path: str = os.path.join('artifacts', 'preprocessor.pkl')
+    numerical_columns: List[str] = field(default_factory=lambda: [
+        'pH Level',
+        'Organic Matter (%)',
+        'Nitrogen Content (kg/ha)',
+        'Phosphorus Content (kg/ha)',
+        'Potassium Content (kg/ha)'
+    ])
+    categorical_columns: List[str] = field(default_factory=lambda: ['District', 'Soil Type'])
+    target_column_name: str = "Fertility Status"
+    # fitted preprocessors and transformed arrays keyed by a hash of the
+    # input data and the transformer config
+    cache_dir: str = os.path.join('artifacts', 'transformation_cache')
+    use_cache: bool = True
+    max_cache_entries: int = 5
+    # keep the one-hot features as CSR and return (X, y) pairs instead of
+    # stacking the target onto a dense copy of the features
+    sparse_output: bool = False
 
 class DataTransformation:
     def __init__(self):
@@ -24,15 +46,9 @@ class DataTransformation:
 
     def get_data_transformer_object(self):
         try:
-            numerical_columns = [
-                'pH Level',
-                'Organic Matter (%)',
-                'Nitrogen Content (kg/ha)',
-                'Phosphorus Content (kg/ha)',
-                'Potassium Content (kg/ha)'
-            ]
+            numerical_columns = self.data_transformation_config.numerical_columns
 
-            categorical_columns = ['District', 'Soil Type']
+            categorical_columns = self.data_transformation_config.categorical_columns
 
             num_pipeline = Pipeline(steps=[
                 ("imputer", SimpleImputer(strategy='median')),
@@ -51,23 +67,102 @@ class DataTransformation:
             preprocessor = ColumnTransformer(transformers=[
                 ("num_pipeline", num_pipeline, numerical_columns),
                 ("cat_pipeline", cat_pipeline, categorical_columns)
-            ])
+            ], sparse_threshold=1.0 if self.data_transformation_config.sparse_output else 0.3)
 
             return preprocessor
 
         except Exception as e:
             raise CustomException(e, sys)
 
-    def initiate_data_transformation(self, train_path, test_path):
+    def get_cache_key(self, train_path, test_path, preprocessing_obj):
+        return compute_fingerprint(
+            compute_file_hash(train_path),
+            compute_file_hash(test_path),
+            describe_estimator(preprocessing_obj),
+            self.data_transformation_config.target_column_name,
+            sklearn.__version__
+        )
+
+    def load_cached_transformation(self, cache_key):
+        cache_path = os.path.join(self.data_transformation_config.cache_dir, cache_key)
+        if not os.path.isdir(cache_path):
+            return None
+
+        cached_preprocessor_path = os.path.join(cache_path, 'preprocessor.pkl')
+        preprocessor_path = self.data_transformation_config.preprocessor_obj_file_path
+        # only touch the served artifact when it actually differs
+        if not os.path.exists(preprocessor_path) or \
+                compute_file_hash(preprocessor_path) != compute_file_hash(cached_preprocessor_path):
+            # readers of the served file see the old one or the new one, never a partial copy
+            tmp_path = f"{preprocessor_path}.tmp-{os.getpid()}"
+            shutil.copyfile(cached_preprocessor_path, tmp_path)
+            os.replace(tmp_path, preprocessor_path)
+
+        train_data = self.load_split(os.path.join(cache_path, 'train'))
+        test_data = self.load_split(os.path.join(cache_path, 'test'))
+        os.utime(cache_path)
+        return train_data, test_data
+
+    @staticmethod
+    def save_split(path_prefix, data):
+        # (X, y) pairs keep X sparse on disk, stacked arrays are stored as is
+        if isinstance(data, tuple):
+            sparse.save_npz(f"{path_prefix}_X.npz", data[0])
+            np.save(f"{path_prefix}_y.npy", data[1])
+        else:
+            np.save(f"{path_prefix}_arr.npy", data)
+
+    @staticmethod
+    def load_split(path_prefix):
+        if os.path.exists(f"{path_prefix}_X.npz"):
+            return sparse.load_npz(f"{path_prefix}_X.npz").tocsr(), np.load(f"{path_prefix}_y.npy")
+        return np.load(f"{path_prefix}_arr.npy")
+
+    def save_cached_transformation(self, cache_key, train_data, test_data):
+        cache_dir = self.data_transformation_config.cache_dir
+        cache_path = os.path.join(cache_dir, cache_key)
+        tmp_path = os.path.join(cache_dir, f".{cache_key}.{os.getpid()}.tmp")
+
+        os.makedirs(tmp_path, exist_ok=True)
+        shutil.copyfile(self.data_transformation_config.preprocessor_obj_file_path,
+                        os.path.join(tmp_path, 'preprocessor.pkl'))
+        self.save_split(os.path.join(tmp_path, 'train'), train_data)
+        self.save_split(os.path.join(tmp_path, 'test'), test_data)
+
+        # publish the entry in one rename so readers never see half of it
         try:
-            train_df = pd.read_csv(train_path)
-            test_df = pd.read_csv(test_path)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            shutil.rmtree(tmp_path, ignore_errors=True)
 
-            logging.info("Read train and test data successfully.")
+        entries = sorted(
+            (os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if not name.startswith('.')),
+            key=os.path.getmtime
+        )
+        for stale_path in entries[:-self.data_transformation_config.max_cache_entries]:
+            shutil.rmtree(stale_path, ignore_errors=True)
 
+    def initiate_data_transformation(self, train_path, test_path):
+        try:
             preprocessing_obj = self.get_data_transformer_object()
 
-            target_column_name = "Fertility Status"
+            if self.data_transformation_config.use_cache:
+                cache_key = self.get_cache_key(train_path, test_path, preprocessing_obj)
+                cached = self.load_cached_transformation(cache_key)
+                if cached is not None:
+                    logging.info("Input data and transformer config unchanged, reusing cached transformation %s", cache_key)
+                    return (cached[0], cached[1], self.data_transformation_config.preprocessor_obj_file_path)
+
+            target_column_name = self.data_transformation_config.target_column_name
+
+            # only load the columns the preprocessor and target need
+            columns = (self.data_transformation_config.numerical_columns
+                       + self.data_transformation_config.categorical_columns
+                       + [target_column_name])
+            train_df = read_dataset(train_path, columns=columns)
+            test_df = read_dataset(test_path, columns=columns)
+
+            logging.info("Read train and test data successfully.")
 
             input_feature_train_df = train_df.drop(columns=[target_column_name])
             target_feature_train_df = train_df[target_column_name]
@@ -78,14 +173,21 @@ class DataTransformation:
             input_feature_train_arr = preprocessing_obj.fit_transform(input_feature_train_df)
             input_feature_test_arr = preprocessing_obj.transform(input_feature_test_df)
 
-            train_arr = np.c_[input_feature_train_arr, np.array(target_feature_train_df)]
-            test_arr = np.c_[input_feature_test_arr, np.array(target_feature_test_df)]
+            if self.data_transformation_config.sparse_output:
+                train_arr = (sparse.csr_matrix(input_feature_train_arr), np.array(target_feature_train_df))
+                test_arr = (sparse.csr_matrix(input_feature_test_arr), np.array(target_feature_test_df))
+            else:
+                train_arr = np.c_[input_feature_train_arr, np.array(target_feature_train_df)]
+                test_arr = np.c_[input_feature_test_arr, np.array(target_feature_test_df)]
 
             save_object(
                 file_path=self.data_transformation_config.preprocessor_obj_file_path,
                 obj=preprocessing_obj
             )
 
+            if self.data_transformation_config.use_cache:
+                self.save_cached_transformation(cache_key, train_arr, test_arr)
+
             logging.info("Saved preprocessing object and returned transformed arrays.")
             return (train_arr, test_arr, self.data_transformation_config.preprocessor_obj_file_path)
 
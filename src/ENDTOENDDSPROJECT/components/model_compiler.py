@@ -0,0 +1,313 @@
+import os
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from src.ENDTOENDDSPROJECT.exception import CustomException
+from src.ENDTOENDDSPROJECT.logger import logging
+from src.ENDTOENDDSPROJECT.utils import (
+    as_model_input, compute_file_hash, load_object, read_dataset, save_object
+)
+
+
+@dataclass
+class ModelCompilerConfig:
+    compiled_model_file_path: str = os.path.join('artifacts', 'compiled_model.pkl')
+    # largest relative difference to the sklearn predictions on the test split
+    rtol: float = 1e-9
+
+class CompiledPreprocessor:
+    '''
+    The fitted ColumnTransformer as fixed arrays: numeric columns are imputed
+    and scaled with one affine transform, categorical columns are a dict
+    lookup from category to output position and the value written there.
+    '''
+    def __init__(self, n_features_out):
+        self.n_features_out = n_features_out
+        self.numeric_columns = []
+        self.numeric_positions = []
+        self.numeric_fill = []
+        self.numeric_offset = []
+        self.numeric_scale = []
+        self.categorical = []
+        self.one_hot_values = np.zeros(n_features_out)
+
+    def finalize(self):
+        for name in ("numeric_positions", "numeric_fill", "numeric_offset", "numeric_scale"):
+            setattr(self, name, np.asarray(getattr(self, name), dtype=np.intp if name == "numeric_positions" else float))
+        self.categorical = [
+            (column, fill, dict(zip(categories, positions)))
+            for column, fill, categories, positions in self.categorical
+        ]
+        return self
+
+    def transform(self, features):
+        # column by column, DataFrame-wide calls cost more than the math
+        X = np.zeros((len(features), self.n_features_out))
+
+        numeric = np.column_stack([features[column].to_numpy(dtype=float) for column in self.numeric_columns])
+        numeric = np.where(np.isnan(numeric), self.numeric_fill, numeric)
+        X[:, self.numeric_positions] = (numeric - self.numeric_offset) / self.numeric_scale
+
+        for column, fill, lookup in self.categorical:
+            values = features[column].to_numpy(dtype=object)
+            missing = pd.isna(values)
+            if missing.any():
+                values = np.where(missing, fill, values)
+            positions = np.fromiter((lookup.get(value, -1) for value in values), dtype=np.intp, count=len(values))
+            rows = np.flatnonzero(positions >= 0)
+            X[rows, positions[rows]] = self.one_hot_values[positions[rows]]
+
+        return X
+
+    def transform_records(self, records):
+        # plain python per record, cheaper than a DataFrame for a few rows
+        X = np.zeros((len(records), self.n_features_out))
+        numeric = np.array([[np.nan if record[column] is None else record[column]
+                             for column in self.numeric_columns] for record in records], dtype=float)
+        numeric = np.where(np.isnan(numeric), self.numeric_fill, numeric)
+        X[:, self.numeric_positions] = (numeric - self.numeric_offset) / self.numeric_scale
+
+        for row, record in enumerate(records):
+            for column, fill, lookup in self.categorical:
+                value = record[column]
+                if value is None or value != value:
+                    value = fill
+                position = lookup.get(value)
+                if position is not None:
+                    X[row, position] = self.one_hot_values[position]
+
+        return X
+
+class CompiledTrees:
+    '''
+    Every tree of a fitted tree model in one set of flat node arrays. Leaves
+    point at themselves, so walking max_depth steps from the roots lands on
+    a leaf for every (row, tree) pair at once. Features are compared in
+    float32 like sklearn does.
+    '''
+    def __init__(self, trees, combine, learning_rate=1.0, baseline=0.0):
+        feature, threshold, left, right, value, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for tree in trees:
+            n_nodes = tree.node_count
+            is_leaf = tree.children_left == -1
+            node_ids = np.arange(n_nodes)
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(tree.threshold)
+            left.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+            right.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+            value.append(tree.value[:, 0, 0])
+            roots.append(offset)
+            offset += n_nodes
+            max_depth = max(max_depth, tree.max_depth)
+
+        self.feature = np.concatenate(feature).astype(np.intp)
+        self.threshold = np.concatenate(threshold)
+        self.left = np.concatenate(left).astype(np.intp)
+        self.right = np.concatenate(right).astype(np.intp)
+        self.value = np.concatenate(value)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.max_depth = max_depth
+        # "mean" for forests, "sum" for boosting
+        self.combine = combine
+        self.learning_rate = learning_rate
+        self.baseline = baseline
+
+    def predict_one(self, x):
+        # a python walk beats array indexing for a single row and few trees
+        if not hasattr(self, "_node_lists"):
+            self._node_lists = (self.feature.tolist(), self.threshold.tolist(),
+                                self.left.tolist(), self.right.tolist())
+        feature, threshold, left, right = self._node_lists
+        x = x.tolist()
+        leaves = []
+        for node in self.roots.tolist():
+            while left[node] != node:
+                node = left[node] if x[feature[node]] <= threshold[node] else right[node]
+            leaves.append(node)
+        return leaves
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if len(X) == 1 and len(self.roots) <= 8:
+            return self.combine_values(self.value[self.predict_one(X[0])][None, :])
+
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+
+        return self.combine_values(self.value[nodes])
+
+    def combine_values(self, values):
+        if self.combine == "mean":
+            return values.mean(axis=1)
+
+        # stage by stage, in the order sklearn adds them up
+        predictions = np.full(len(values), self.baseline)
+        for stage in range(values.shape[1]):
+            predictions += self.learning_rate * values[:, stage]
+        return predictions
+
+class CompiledLinear:
+    def __init__(self, coef, intercept):
+        self.coef = np.asarray(coef, dtype=float)
+        self.intercept = float(intercept)
+
+    def predict(self, X):
+        return X @ self.coef + self.intercept
+
+class CompiledModel:
+    '''
+    Compiled preprocessor plus, when the winner is supported, the compiled
+    estimator. source_hashes ties it to the pickles it was built from.
+    '''
+    def __init__(self, preprocessor, estimator, source_hashes):
+        self.preprocessor = preprocessor
+        self.estimator = estimator
+        self.source_hashes = source_hashes
+
+    def transform(self, features):
+        if isinstance(features, pd.DataFrame):
+            return self.preprocessor.transform(features)
+        return self.preprocessor.transform_records(features)
+
+    def predict(self, features):
+        return self.estimator.predict(self.transform(features))
+
+class ModelCompiler:
+    def __init__(self):
+        self.model_compiler_config = ModelCompilerConfig()
+
+    # sklearn is only imported to compile; unpickling a compiled model for
+    # serving needs nothing beyond numpy and pandas
+
+    def compile_preprocessor(self, preprocessor):
+        from sklearn.compose import ColumnTransformer
+        from sklearn.impute import SimpleImputer
+        from sklearn.pipeline import Pipeline
+        from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+        if not isinstance(preprocessor, ColumnTransformer) or preprocessor.remainder != "drop":
+            raise ValueError("Only a ColumnTransformer without remainder columns can be compiled")
+
+        compiled = CompiledPreprocessor(len(preprocessor.get_feature_names_out()))
+        position = 0
+        for name, transformer, columns in preprocessor.transformers_:
+            if transformer == "drop" or name == "remainder":
+                continue
+            steps = [step for _, step in transformer.steps] if isinstance(transformer, Pipeline) else [transformer]
+            columns = list(columns)
+
+            fill = np.full(len(columns), np.nan, dtype=object)
+            offset = np.zeros(len(columns))
+            scale = np.ones(len(columns))
+            encoder = None
+            scaled = False
+            for step in steps:
+                if isinstance(step, SimpleImputer) and encoder is None and not scaled:
+                    fill = step.statistics_
+                elif isinstance(step, OneHotEncoder) and encoder is None and not scaled:
+                    if step.handle_unknown != "ignore" or step.drop is not None or \
+                            step.min_frequency is not None or step.max_categories is not None:
+                        raise ValueError("OneHotEncoder must use handle_unknown='ignore' without drop or infrequent categories")
+                    encoder = step
+                    scale = np.ones(sum(len(categories) for categories in step.categories_))
+                elif isinstance(step, StandardScaler) and not scaled:
+                    if step.with_mean and encoder is not None:
+                        raise ValueError(f"Cannot compile a centered one-hot encoding in {name}")
+                    if step.with_mean:
+                        offset = step.mean_
+                    if step.with_std:
+                        scale = step.scale_
+                    scaled = True
+                else:
+                    raise ValueError(f"Cannot compile {type(step).__name__} in {name}")
+
+            if encoder is None:
+                compiled.numeric_columns += columns
+                compiled.numeric_positions += list(range(position, position + len(columns)))
+                compiled.numeric_fill += [np.nan if value is None else float(value) for value in fill]
+                compiled.numeric_offset += list(offset)
+                compiled.numeric_scale += list(scale)
+                position += len(columns)
+            else:
+                for column, column_fill, categories in zip(columns, fill, encoder.categories_):
+                    positions = list(range(position, position + len(categories)))
+                    compiled.categorical.append((column, column_fill, list(categories), positions))
+                    position += len(categories)
+                # a scaled one-hot column holds 1 / scale, as in sklearn's sparse path
+                compiled.one_hot_values[position - len(scale):position] = 1.0 * (1 / scale)
+
+        if position != compiled.n_features_out:
+            raise ValueError("Compiled preprocessor does not cover every output column")
+        return compiled.finalize()
+
+    def compile_estimator(self, model):
+        '''
+        Returns None for estimators without a compiled form; the prediction
+        pipeline then scores the compiled features with the sklearn model.
+        '''
+        from sklearn.dummy import DummyRegressor
+        from sklearn.ensemble import ExtraTreesRegressor, GradientBoostingRegressor, RandomForestRegressor
+        from sklearn.linear_model import ElasticNet, Lasso, LinearRegression, Ridge
+        from sklearn.tree import BaseDecisionTree
+
+        if isinstance(model, BaseDecisionTree) and model.n_outputs_ == 1:
+            return CompiledTrees([model.tree_], combine="mean")
+        if isinstance(model, (RandomForestRegressor, ExtraTreesRegressor)) and model.n_outputs_ == 1:
+            return CompiledTrees([tree.tree_ for tree in model.estimators_], combine="mean")
+        if isinstance(model, GradientBoostingRegressor):
+            if isinstance(model.init_, DummyRegressor):
+                baseline = float(model.init_.constant_.ravel()[0])
+            elif model.init_ == "zero":
+                baseline = 0.0
+            else:
+                return None
+            return CompiledTrees([tree.tree_ for tree in model.estimators_[:, 0]], combine="sum",
+                                 learning_rate=model.learning_rate, baseline=baseline)
+        if isinstance(model, (LinearRegression, Ridge, Lasso, ElasticNet)) and np.ndim(model.coef_) == 1:
+            return CompiledLinear(model.coef_, model.intercept_)
+        return None
+
+    def initiate_model_export(self, preprocessor_path, model_path, test_data_path, target_column_name):
+        '''
+        Compiles the fitted preprocessor and model and checks the compiled
+        predictions against the sklearn ones on the test split before saving.
+        '''
+        try:
+            preprocessor = load_object(preprocessor_path)
+            model = load_object(model_path)
+
+            compiled = CompiledModel(
+                self.compile_preprocessor(preprocessor),
+                self.compile_estimator(model),
+                source_hashes=(compute_file_hash(model_path), compute_file_hash(preprocessor_path))
+            )
+            if compiled.estimator is None:
+                logging.info("No compiled form for %s, only the preprocessor is compiled", type(model).__name__)
+
+            test_df = read_dataset(test_data_path).drop(columns=[target_column_name])
+            expected_features = preprocessor.transform(test_df)
+            expected_features = expected_features.toarray() if hasattr(expected_features, "toarray") else expected_features
+            features = compiled.transform(test_df)
+            if not np.allclose(features, expected_features, rtol=self.model_compiler_config.rtol, atol=0):
+                raise ValueError("Compiled preprocessor does not match the sklearn one on the test split")
+
+            if compiled.estimator is not None:
+                expected = model.predict(as_model_input(model, preprocessor.transform(test_df)))
+                predictions = compiled.predict(test_df)
+                if not np.allclose(predictions, expected, rtol=self.model_compiler_config.rtol, atol=1e-12):
+                    raise ValueError("Compiled model does not match the sklearn one on the test split")
+
+            save_object(file_path=self.model_compiler_config.compiled_model_file_path, obj=compiled)
+            logging.info("Compiled model matches sklearn on %s test rows", len(test_df))
+            return self.model_compiler_config.compiled_model_file_path
+
+        except Exception as e:
+            raise CustomException(e, sys)
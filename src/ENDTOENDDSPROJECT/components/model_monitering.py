@@ -0,0 +1,287 @@
+import json
+import math
+import os
+import sys
+import threading
+import time
+from bisect import bisect_right
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from src.ENDTOENDDSPROJECT.exception import CustomException
+from src.ENDTOENDDSPROJECT.logger import logging
+from src.ENDTOENDDSPROJECT.utils import read_dataset, load_object_cached
+
+# Serving imports this module, so it must stay free of sklearn; the column
+# lists come from DataTransformationConfig through the reference file.
+
+
+@dataclass
+class ModelMonitorConfig:
+    drift_reference_file_path: str = os.path.join('artifacts', 'drift_reference.json')
+    # quantile bins per numerical column, fixed at training time
+    n_bins: int = 10
+    # most frequent training values kept per categorical column, the rest
+    # share one "other" bucket
+    max_categories: int = 50
+    # drift is computed once per check_every scored rows
+    check_every: int = int(os.getenv("DRIFT_CHECK_EVERY", 1000))
+    psi_threshold: float = 0.2
+    ks_threshold: float = 0.1
+    # floor for empty buckets so PSI stays finite
+    epsilon: float = 1e-4
+
+def get_bucket_counts(feature, values):
+    '''
+    Histogram of a column over the buckets of a reference feature: the
+    quantile bins or the kept categories and "other", then "missing" last.
+    Matches DriftMonitor.get_bucket for every value.
+    '''
+    n_buckets = len(feature["expected"])
+    if feature["kind"] == "numerical":
+        values = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=float)
+        missing = np.isnan(values)
+        buckets = np.searchsorted(feature["cuts"], values[~missing], side="right")
+    else:
+        values = pd.Series(values, dtype=object)
+        missing = values.isna().to_numpy()
+        buckets = values[~missing].astype(str).map(feature["index"]).fillna(n_buckets - 2).to_numpy(dtype=int)
+
+    counts = np.bincount(buckets, minlength=n_buckets)
+    counts[-1] += int(missing.sum())
+    return counts.tolist()
+
+def read_drift_reference(file_path):
+    '''
+    Loads a reference written by ModelMonitor into the form DriftMonitor
+    bins with: per feature its cuts or category index and the expected
+    share of every bucket.
+    '''
+    with open(file_path) as file_obj:
+        reference = json.load(file_obj)
+
+    features = []
+    for name, entry in reference["features"].items():
+        total = sum(entry["counts"]) or 1
+        feature = {"name": name, "kind": entry["kind"], "expected": [count / total for count in entry["counts"]]}
+        if entry["kind"] == "numerical":
+            feature["cuts"] = entry["cuts"]
+        else:
+            feature["categories"] = entry["categories"]
+            feature["index"] = {category: index for index, category in enumerate(entry["categories"])}
+        features.append(feature)
+    return {"path": file_path, "rows": reference["rows"], "features": features}
+
+class ModelMonitor:
+    '''
+    Training side of the drift monitor: summarizes the training split into
+    the fixed buckets the service counts live traffic in.
+    '''
+    def __init__(self):
+        self.model_monitor_config = ModelMonitorConfig()
+
+    def initiate_drift_reference(self, train_data_path, numerical_columns, categorical_columns):
+        try:
+            config = self.model_monitor_config
+            train_df = read_dataset(train_data_path, columns=list(numerical_columns) + list(categorical_columns))
+
+            features = {}
+            for column in numerical_columns:
+                values = pd.to_numeric(train_df[column], errors="coerce").dropna().to_numpy(dtype=float)
+                quantiles = np.linspace(0, 1, config.n_bins + 1)[1:-1]
+                cuts = np.unique(np.quantile(values, quantiles)).tolist() if len(values) else []
+                buckets = {"kind": "numerical", "cuts": cuts, "expected": [0] * (len(cuts) + 2)}
+                features[column] = {"kind": "numerical", "cuts": cuts,
+                                    "counts": get_bucket_counts(buckets, train_df[column])}
+
+            for column in categorical_columns:
+                frequencies = train_df[column].dropna().astype(str).value_counts()
+                categories = frequencies.index[:config.max_categories].tolist()
+                buckets = {"kind": "categorical", "expected": [0] * (len(categories) + 2),
+                           "index": {category: index for index, category in enumerate(categories)}}
+                features[column] = {"kind": "categorical", "categories": categories,
+                                    "counts": get_bucket_counts(buckets, train_df[column])}
+
+            reference = {"rows": len(train_df), "features": features}
+            file_path = config.drift_reference_file_path
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            tmp_path = f"{file_path}.tmp"
+            with open(tmp_path, "w") as file_obj:
+                json.dump(reference, file_obj, indent=2)
+            os.replace(tmp_path, file_path)
+            logging.info("Saved the drift reference of %s columns to %s", len(features), file_path)
+            return file_path
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+class DriftMonitor:
+    '''
+    Serving side of the drift monitor, in front of any predictor taking
+    lists of records. Every scored row adds one count per feature to a
+    fixed-size histogram, an O(1) update, and once per check_every rows the
+    window is compared with the training reference: PSI for every feature
+    and, for numerical ones, the KS distance between the binned CDFs (a
+    lower bound of the exact statistic). The reference follows the artifact
+    store, a new one resets the window at the next check. Monitoring errors
+    are logged and never fail a prediction.
+    '''
+    def __init__(self, predictor, predict_pipeline=None, config=None):
+        self.predictor = predictor
+        self.predict_pipeline = predict_pipeline or predictor
+        self.model_monitor_config = config or ModelMonitorConfig()
+        self.reference = None
+        self.window = []
+        self.window_rows = 0
+        self.rows_seen = 0
+        self.last_report = None
+        self.lock = threading.Lock()
+        self.counters = {"checks": 0, "drift_alerts": 0, "errors": 0}
+
+    def load_reference(self):
+        '''
+        Switches to the reference of the served artifacts when it changed,
+        starting an empty window. Without one, rows are counted but not
+        binned, and loading is retried at every check.
+        '''
+        path = self.predict_pipeline.get_artifact_paths().get("drift_reference")
+        reference = load_object_cached(path, loader=read_drift_reference) if path else None
+        with self.lock:
+            if reference is not self.reference:
+                self.reference = reference
+                self.window = [[0] * len(feature["expected"]) for feature in reference["features"]] if reference else []
+                self.window_rows = 0
+                logging.info("Drift monitor reference: %s", path)
+        return reference
+
+    @staticmethod
+    def get_bucket(feature, value):
+        if feature["kind"] == "numerical":
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                return len(feature["expected"]) - 1
+            if value != value:
+                return len(feature["expected"]) - 1
+            return bisect_right(feature["cuts"], value)
+
+        if value is None or value != value:
+            return len(feature["expected"]) - 1
+        return feature["index"].get(str(value), len(feature["expected"]) - 2)
+
+    def observe(self, features):
+        # features is a DataFrame or a list of dicts keyed by column name
+        try:
+            n_rows = len(features)
+            reference = self.reference
+            histograms, rows = None, None
+            if reference is not None and isinstance(features, pd.DataFrame):
+                # a column missing from the frame counts as missing values
+                histograms = [get_bucket_counts(feature, features[feature["name"]] if feature["name"] in features
+                                                else [None] * n_rows)
+                              for feature in reference["features"]]
+            elif reference is not None:
+                get_bucket = self.get_bucket
+                rows = [[get_bucket(feature, record.get(feature["name"])) for feature in reference["features"]]
+                        for record in features]
+
+            # binning happens above, the lock only guards the additions
+            with self.lock:
+                self.rows_seen += n_rows
+                self.window_rows += n_rows
+                if reference is not None and reference is self.reference:
+                    window = self.window
+                    if histograms is not None:
+                        for counts, histogram in zip(window, histograms):
+                            for bucket, count in enumerate(histogram):
+                                counts[bucket] += count
+                    else:
+                        for buckets in rows:
+                            for counts, bucket in zip(window, buckets):
+                                counts[bucket] += 1
+                due = self.window_rows >= self.model_monitor_config.check_every
+
+            if due:
+                self.check()
+
+        except Exception as e:
+            with self.lock:
+                self.counters["errors"] += 1
+            logging.warning("Drift monitor failed to observe a batch: %s", e)
+
+    def compute_drift(self, reference, window):
+        config = self.model_monitor_config
+        report = {}
+        for feature, counts in zip(reference["features"], window):
+            total = sum(counts)
+            if not total:
+                continue
+            observed = [max(count / total, config.epsilon) for count in counts]
+            expected = [max(share, config.epsilon) for share in feature["expected"]]
+            psi = sum((actual - wanted) * math.log(actual / wanted) for actual, wanted in zip(observed, expected))
+            result = {"psi": round(psi, 6)}
+
+            if feature["kind"] == "numerical":
+                # CDFs of the non-missing rows, compared at the bin edges
+                observed_total = sum(counts[:-1])
+                expected_total = sum(feature["expected"][:-1])
+                ks, observed_cdf, expected_cdf = 0.0, 0.0, 0.0
+                if observed_total and expected_total:
+                    for count, share in zip(counts[:-1], feature["expected"][:-1]):
+                        observed_cdf += count / observed_total
+                        expected_cdf += share / expected_total
+                        ks = max(ks, abs(observed_cdf - expected_cdf))
+                result["ks"] = round(ks, 6)
+
+            result["drifted"] = (psi > config.psi_threshold
+                                 or result.get("ks", 0.0) > config.ks_threshold)
+            report[feature["name"]] = result
+        return report
+
+    def check(self):
+        '''
+        Scores the current window against the reference and starts a new one.
+        Runs once per check_every rows on the request that fills the window.
+        '''
+        with self.lock:
+            reference, window, window_rows = self.reference, self.window, self.window_rows
+            self.window = [[0] * len(counts) for counts in window]
+            self.window_rows = 0
+
+        if reference is not None and window_rows:
+            features = self.compute_drift(reference, window)
+            drifted = sorted(name for name, result in features.items() if result["drifted"])
+            report = {"checked_at": time.time(), "rows": window_rows, "drifted": drifted, "features": features}
+            with self.lock:
+                self.last_report = report
+                self.counters["checks"] += 1
+                self.counters["drift_alerts"] += bool(drifted)
+            if drifted:
+                logging.warning("Input drift detected in %s over the last %s rows", drifted, window_rows)
+            else:
+                logging.info("No input drift over the last %s rows", window_rows)
+
+        # picks up a reference published since the last check
+        self.load_reference()
+
+    def predict(self, records):
+        preds = self.predictor.predict(records)
+        self.observe(records)
+        return preds
+
+    def snapshot(self):
+        '''
+        Copy of the monitor state: a few small lists, cheap enough to take
+        on every metrics request.
+        '''
+        with self.lock:
+            reference = self.reference
+            snapshot = dict(self.counters)
+            snapshot.update(rows_seen=self.rows_seen, window_rows=self.window_rows,
+                            check_every=self.model_monitor_config.check_every, last_report=self.last_report,
+                            reference=reference["path"] if reference else None)
+            snapshot["window"] = ({feature["name"]: list(counts) for feature, counts in zip(reference["features"], self.window)}
+                                  if reference else {})
+        return snapshot
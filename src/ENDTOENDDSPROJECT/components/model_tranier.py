@@ -1,6 +1,8 @@
+import json
 import os
 import sys
 from dataclasses import dataclass
+from typing import Optional
 from urllib.parse import urlparse
 import mlflow
 import mlflow.sklearn
@@ -20,12 +22,34 @@ from xgboost import XGBRegressor
 
 from src.ENDTOENDDSPROJECT.exception import CustomException
 from src.ENDTOENDDSPROJECT.logger import logging
-from src.ENDTOENDDSPROJECT.utils import save_object,evaluate_models
+from src.ENDTOENDDSPROJECT.utils import save_object,evaluate_models,as_model_input
 
 
 @dataclass
 class ModelTrainerConfig:
     trained_model_file_path=os.path.join("artifacts","model.pkl")
+    model_report_file_path=os.path.join("artifacts","model_report.json")
+    # the training pipeline logs to MLflow in its own evaluation stage
+    log_to_mlflow: bool = True
+    # worker budget for the model search, -1 uses every core
+    n_jobs: int = int(os.getenv("TRAINING_N_JOBS", 1))
+    # refit each searched model on the full training set; when False models
+    # are ranked on their CV score and only the winner is fit
+    refit: bool = True
+    # "grid" (exhaustive), "halving" or "random"; the random search samples
+    # search_n_iter candidates and can be capped at search_time_budget seconds
+    search_strategy: str = os.getenv("TRAINING_SEARCH_STRATEGY", "grid")
+    search_n_iter: int = 10
+    search_time_budget: Optional[float] = None
+    search_random_state: int = 42
+    # rows in the first halving round, None means a quarter of the training set
+    search_min_resources: Optional[int] = None
+    # grid search ensemble sizes (n_estimators/iterations) by growing one
+    # ensemble and scoring it at each size
+    warm_start_sweeps: bool = True
+    # codec of the checksummed model.pkl and MLflow model artifact, see
+    # utils.COMPRESSION_CODECS; falls back to zlib when lz4 is not installed
+    model_compression: str = os.getenv("MODEL_COMPRESSION", "lz4")
 
 class ModelTrainer:
     def __init__(self):
@@ -37,62 +61,122 @@ class ModelTrainer:
         r2 = r2_score(actual, pred)
         return rmse, mae, r2
 
+    def get_models(self):
+        return {
+            "Random Forest": RandomForestRegressor(),
+            "Decision Tree": DecisionTreeRegressor(),
+            "Gradient Boosting": GradientBoostingRegressor(),
+            "Linear Regression": LinearRegression(),
+            "XGBRegressor": XGBRegressor(),
+            "CatBoosting Regressor": CatBoostRegressor(verbose=False),
+            "AdaBoost Regressor": AdaBoostRegressor(),
+        }
+
+    def get_params(self):
+        return {
+            "Decision Tree": {
+                'criterion':['squared_error', 'friedman_mse', 'absolute_error', 'poisson'],
+                # 'splitter':['best','random'],
+                # 'max_features':['sqrt','log2'],
+            },
+            "Random Forest":{
+                # 'criterion':['squared_error', 'friedman_mse', 'absolute_error', 'poisson'],
+             
+                # 'max_features':['sqrt','log2',None],
+                'n_estimators': [8,16,32,64,128,256]
+            },
+            "Gradient Boosting":{
+                # 'loss':['squared_error', 'huber', 'absolute_error', 'quantile'],
+                'learning_rate':[.1,.01,.05,.001],
+                'subsample':[0.6,0.7,0.75,0.8,0.85,0.9],
+                # 'criterion':['squared_error', 'friedman_mse'],
+                # 'max_features':['auto','sqrt','log2'],
+                'n_estimators': [8,16,32,64,128,256]
+            },
+            "Linear Regression":{},
+            "XGBRegressor":{
+                'learning_rate':[.1,.01,.05,.001],
+                'n_estimators': [8,16,32,64,128,256]
+            },
+            "CatBoosting Regressor":{
+                'depth': [6,8,10],
+                'learning_rate': [0.01, 0.05, 0.1],
+                'iterations': [30, 50, 100]
+            },
+            "AdaBoost Regressor":{
+                'learning_rate':[.1,.01,0.5,.001],
+                # 'loss':['linear','square','exponential'],
+                'n_estimators': [8,16,32,64,128,256]
+            }
+            
+        }
+
+    def log_to_mlflow(self,best_model,best_model_name,best_params,X_test,y_test):
+        mlflow.set_registry_uri("https://dagshub.com/vibhutisarode/datascience.mlflow")
+        tracking_url_type_store = urlparse(mlflow.get_tracking_uri()).scheme
+
+        # mlflow - Using basic logging compatible with DagsHub
+
+        with mlflow.start_run():
+
+            predicted_qualities = best_model.predict(X_test)
+
+            (rmse, mae, r2) = self.eval_metrics(y_test, predicted_qualities)
+
+            # Log model name and parameters
+            mlflow.log_param("model_name", best_model_name)
+            mlflow.log_params(best_params)
+
+            mlflow.log_metric("rmse", rmse)
+            mlflow.log_metric("r2", r2)
+            mlflow.log_metric("mae", mae)
+
+            # Use basic model logging without advanced features
+            try:
+                # Try to log model artifacts (pickled model)
+                import tempfile
+                
+                # Create a temporary file to save the model
+                with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.pkl') as f:
+                    temp_model_path = f.name
+                save_object(temp_model_path, best_model, compression=self.model_trainer_config.model_compression)
+                
+                # Log the model file as an artifact
+                mlflow.log_artifact(temp_model_path, "model")
+                
+                # Clean up temporary file
+                os.unlink(temp_model_path)
+                
+            except Exception as mlflow_error:
+                logging.warning(f"MLflow model logging failed: {mlflow_error}")
+                # Continue execution even if MLflow logging fails
+
+        return rmse, mae, r2
+
     def initiate_model_trainer(self,train_array,test_array):
         try:
             logging.info("Split training and test input data")
-            X_train,y_train,X_test,y_test=(
-                train_array[:,:-1],
-                train_array[:,-1],
-                test_array[:,:-1],
-                test_array[:,-1]
-            )
-            models = {
-                "Random Forest": RandomForestRegressor(),
-                "Decision Tree": DecisionTreeRegressor(),
-                "Gradient Boosting": GradientBoostingRegressor(),
-                "Linear Regression": LinearRegression(),
-                "XGBRegressor": XGBRegressor(),
-                "CatBoosting Regressor": CatBoostRegressor(verbose=False),
-                "AdaBoost Regressor": AdaBoostRegressor(),
-            }
-            params={
-                "Decision Tree": {
-                    'criterion':['squared_error', 'friedman_mse', 'absolute_error', 'poisson'],
-                    # 'splitter':['best','random'],
-                    # 'max_features':['sqrt','log2'],
-                },
-                "Random Forest":{
-                    # 'criterion':['squared_error', 'friedman_mse', 'absolute_error', 'poisson'],
-                 
-                    # 'max_features':['sqrt','log2',None],
-                    'n_estimators': [8,16,32,64,128,256]
-                },
-                "Gradient Boosting":{
-                    # 'loss':['squared_error', 'huber', 'absolute_error', 'quantile'],
-                    'learning_rate':[.1,.01,.05,.001],
-                    'subsample':[0.6,0.7,0.75,0.8,0.85,0.9],
-                    # 'criterion':['squared_error', 'friedman_mse'],
-                    # 'max_features':['auto','sqrt','log2'],
-                    'n_estimators': [8,16,32,64,128,256]
-                },
-                "Linear Regression":{},
-                "XGBRegressor":{
-                    'learning_rate':[.1,.01,.05,.001],
-                    'n_estimators': [8,16,32,64,128,256]
-                },
-                "CatBoosting Regressor":{
-                    'depth': [6,8,10],
-                    'learning_rate': [0.01, 0.05, 0.1],
-                    'iterations': [30, 50, 100]
-                },
-                "AdaBoost Regressor":{
-                    'learning_rate':[.1,.01,0.5,.001],
-                    # 'loss':['linear','square','exponential'],
-                    'n_estimators': [8,16,32,64,128,256]
-                }
-                
-            }
-            model_report:dict=evaluate_models(X_train,y_train,X_test,y_test,models,params)
+            if isinstance(train_array, tuple):
+                # sparse transformation output already comes as (X, y)
+                (X_train,y_train),(X_test,y_test)=train_array,test_array
+            else:
+                X_train,y_train,X_test,y_test=(
+                    train_array[:,:-1],
+                    train_array[:,-1],
+                    test_array[:,:-1],
+                    test_array[:,-1]
+                )
+            models=self.get_models()
+            params=self.get_params()
+            model_report:dict=evaluate_models(X_train,y_train,X_test,y_test,models,params,
+                                               n_jobs=self.model_trainer_config.n_jobs,
+                                               refit=self.model_trainer_config.refit,
+                                               search_strategy=self.model_trainer_config.search_strategy,
+                                               n_iter=self.model_trainer_config.search_n_iter,
+                                               time_budget=self.model_trainer_config.search_time_budget,
+                                               random_state=self.model_trainer_config.search_random_state,
+                                               min_resources=self.model_trainer_config.search_min_resources,
+                                               warm_start=self.model_trainer_config.warm_start_sweeps)
 
             ## To get best model score from dict
             best_model_score = max(sorted(model_report.values()))
@@ -104,6 +188,12 @@ class ModelTrainer:
             ]
             best_model = models[best_model_name]
 
+            X_train=as_model_input(best_model,X_train)
+            X_test=as_model_input(best_model,X_test)
+
+            if not self.model_trainer_config.refit:
+                best_model.fit(X_train,y_train)
+
             print("This is the best model:")
             print(best_model_name)
 
@@ -117,48 +207,8 @@ class ModelTrainer:
 
             best_params = params[actual_model]
 
-            mlflow.set_registry_uri("https://dagshub.com/vibhutisarode/datascience.mlflow")
-            tracking_url_type_store = urlparse(mlflow.get_tracking_uri()).scheme
-
-            # mlflow - Using basic logging compatible with DagsHub
-
-            with mlflow.start_run():
-
-                predicted_qualities = best_model.predict(X_test)
-
-                (rmse, mae, r2) = self.eval_metrics(y_test, predicted_qualities)
-
-                # Log model name and parameters
-                mlflow.log_param("model_name", best_model_name)
-                mlflow.log_params(best_params)
-
-                mlflow.log_metric("rmse", rmse)
-                mlflow.log_metric("r2", r2)
-                mlflow.log_metric("mae", mae)
-
-                # Use basic model logging without advanced features
-                try:
-                    # Try to log model artifacts (pickled model)
-                    import pickle
-                    import tempfile
-                    
-                    # Create a temporary file to save the model
-                    with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.pkl') as f:
-                        pickle.dump(best_model, f)
-                        temp_model_path = f.name
-                    
-                    # Log the model file as an artifact
-                    mlflow.log_artifact(temp_model_path, "model")
-                    
-                    # Clean up temporary file
-                    os.unlink(temp_model_path)
-                    
-                except Exception as mlflow_error:
-                    logging.warning(f"MLflow model logging failed: {mlflow_error}")
-                    # Continue execution even if MLflow logging fails
-
-
-
+            if self.model_trainer_config.log_to_mlflow:
+                self.log_to_mlflow(best_model,best_model_name,best_params,X_test,y_test)
 
             if best_model_score<0.6:
                 raise CustomException("No best model found")
@@ -166,12 +216,22 @@ class ModelTrainer:
 
             save_object(
                 file_path=self.model_trainer_config.trained_model_file_path,
-                obj=best_model
+                obj=best_model,
+                compression=self.model_trainer_config.model_compression
             )
 
             predicted=best_model.predict(X_test)
 
             r2_square = r2_score(y_test, predicted)
+
+            with open(self.model_trainer_config.model_report_file_path,"w") as report_file:
+                json.dump({
+                    "best_model_name": best_model_name,
+                    "best_model_score": float(best_model_score),
+                    "r2_score": float(r2_square),
+                    "model_report": {name: float(score) for name, score in model_report.items()}
+                }, report_file, indent=2)
+
             return r2_square
 
 
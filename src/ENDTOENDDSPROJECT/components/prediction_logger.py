@@ -0,0 +1,279 @@
+import atexit
+import os
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from src.ENDTOENDDSPROJECT.exception import CustomException
+from src.ENDTOENDDSPROJECT.logger import logging
+
+# pyarrow is only imported by the writer thread, so serving startup does
+# not pay for it.
+
+
+@dataclass
+class PredictionLoggerConfig:
+    log_dir: str = os.getenv("PREDICTION_LOG_DIR", os.path.join('artifacts', 'prediction_log'))
+    # the keys of CustomData.get_data_as_dict, logged in this order
+    input_columns: List[str] = field(default_factory=lambda: [
+        'District',
+        'Soil Type',
+        'pH Level',
+        'Organic Matter (%)',
+        'Nitrogen Content (kg/ha)',
+        'Phosphorus Content (kg/ha)',
+        'Potassium Content (kg/ha)'
+    ])
+    # rows held in memory waiting for the writer
+    max_queue_rows: int = int(os.getenv("PREDICTION_LOG_QUEUE_ROWS", 10000))
+    # "drop_newest" discards the incoming rows when the queue is full,
+    # "drop_oldest" makes room by discarding the oldest queued rows, and
+    # "block" waits up to block_timeout_ms for room before dropping
+    overflow_policy: str = os.getenv("PREDICTION_LOG_OVERFLOW", "drop_newest")
+    block_timeout_ms: float = 50
+    # the writer appends a row group once this many rows are queued or
+    # flush_interval_seconds have passed
+    batch_rows: int = 1000
+    flush_interval_seconds: float = 1.0
+    # a segment is closed and a new one started after this many rows or seconds
+    segment_max_rows: int = 100000
+    segment_max_seconds: float = 300
+
+class PredictionLogger:
+    '''
+    Append-only log of every prediction, in front of any predictor taking
+    lists of records. Requests only put their rows on a bounded in-memory
+    queue; a background thread appends them in batches to Parquet segments
+    under log_dir. A segment is written as <name>.parquet.inprogress and
+    renamed to <name>.parquet once closed, so readers only ever see
+    complete files. When the queue is full, rows are dropped according to
+    overflow_policy and counted, never written in the request path.
+    '''
+    POLICIES = ("drop_newest", "drop_oldest", "block")
+
+    def __init__(self, predictor, predict_pipeline=None, config=None):
+        self.predictor = predictor
+        self.predict_pipeline = predict_pipeline or predictor
+        self.prediction_logger_config = config or PredictionLoggerConfig()
+        if self.prediction_logger_config.overflow_policy not in self.POLICIES:
+            raise ValueError(f"overflow_policy must be one of {self.POLICIES}")
+
+        self.items = deque()
+        self.queued_rows = 0
+        self.condition = threading.Condition()
+        self.stopping = False
+        self.worker = None
+        self.counters = {"logged": 0, "dropped": 0, "write_errors": 0, "segments": 0}
+
+        # current segment, only touched by the writer thread
+        self.segment_writer = None
+        self.segment_path = None
+        self.segment_rows = 0
+        self.segment_started = None
+        self.segment_sequence = 0
+
+    def start(self):
+        with self.condition:
+            if self.worker is None:
+                self.worker = threading.Thread(target=self.run, name="prediction-logger", daemon=True)
+                self.worker.start()
+                atexit.register(self.close)
+
+    def predict(self, records):
+        version = self.predict_pipeline.get_artifact_version()
+        started = time.perf_counter()
+        preds = self.predictor.predict(records)
+        self.log(records, preds, (time.perf_counter() - started) * 1000, version)
+        return preds
+
+    def log(self, features, preds, latency_ms, version):
+        '''
+        Queues one scored request: features is a DataFrame or a list of dicts
+        keyed by column name, version the (model, preprocessor) hashes.
+        '''
+        n_rows = len(preds)
+        if not n_rows:
+            return
+        config = self.prediction_logger_config
+        item = (time.time(), features, preds, latency_ms, version)
+
+        with self.condition:
+            if config.overflow_policy == "block":
+                deadline = time.monotonic() + config.block_timeout_ms / 1000
+                while self.queued_rows + n_rows > config.max_queue_rows and not self.stopping:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self.condition.wait(remaining):
+                        break
+            elif config.overflow_policy == "drop_oldest":
+                while self.items and self.queued_rows + n_rows > config.max_queue_rows:
+                    dropped = len(self.items.popleft()[2])
+                    self.queued_rows -= dropped
+                    self.counters["dropped"] += dropped
+
+            if self.stopping or self.queued_rows + n_rows > config.max_queue_rows:
+                self.counters["dropped"] += n_rows
+                return
+            self.items.append(item)
+            self.queued_rows += n_rows
+            if self.queued_rows >= config.batch_rows:
+                self.condition.notify_all()
+
+    def take_batch(self):
+        config = self.prediction_logger_config
+        with self.condition:
+            deadline = time.monotonic() + config.flush_interval_seconds
+            while self.queued_rows < config.batch_rows and not self.stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            items = list(self.items)
+            self.items.clear()
+            self.queued_rows = 0
+            # wakes writers blocked on a full queue
+            self.condition.notify_all()
+            return items
+
+    def to_table(self, items):
+        '''
+        One Arrow table for a batch of queued requests. Consecutive record
+        lists are converted together, one list comprehension per column, since
+        per-request work here competes with the request threads for the GIL.
+        '''
+        import pyarrow as pa
+
+        tables, run = [], []
+        for item in items + [None]:
+            if item is not None and not isinstance(item[1], pd.DataFrame):
+                run.append(item)
+                continue
+            if run:
+                records = [record for queued in run for record in queued[1]]
+                inputs = {column: [record.get(column) for record in records]
+                          for column in self.prediction_logger_config.input_columns}
+                tables.append(self.build_table(run, inputs))
+                run = []
+            if item is not None:
+                features = item[1]
+                inputs = {column: features[column] if column in features else [None] * len(features)
+                          for column in self.prediction_logger_config.input_columns}
+                tables.append(self.build_table([item], inputs))
+        return pa.concat_tables(tables)
+
+    def build_table(self, items, inputs):
+        import pyarrow as pa
+
+        counts = [len(item[2]) for item in items]
+        data = {"logged_at": np.repeat([int(item[0] * 1000) for item in items], counts)}
+        data.update(inputs)
+        data["prediction"] = np.concatenate([np.asarray(item[2], dtype=float) for item in items])
+        data["latency_ms"] = np.repeat([float(item[3]) for item in items], counts)
+        data["batch_rows"] = np.repeat(counts, counts).astype(np.int32)
+        data["model_sha256"] = np.repeat([item[4][0] for item in items], counts).tolist()
+        data["preprocessor_sha256"] = np.repeat([item[4][1] for item in items], counts).tolist()
+        return pa.Table.from_pydict(data, schema=self.get_schema())
+
+    def get_schema(self):
+        import pyarrow as pa
+
+        string_columns = ('District', 'Soil Type')
+        return pa.schema(
+            [pa.field("logged_at", pa.timestamp("ms"))]
+            + [pa.field(column, pa.string() if column in string_columns else pa.float64())
+               for column in self.prediction_logger_config.input_columns]
+            + [pa.field("prediction", pa.float64()), pa.field("latency_ms", pa.float64()),
+               pa.field("batch_rows", pa.int32()), pa.field("model_sha256", pa.string()),
+               pa.field("preprocessor_sha256", pa.string())]
+        )
+
+    def open_segment(self):
+        import pyarrow.parquet as pq
+
+        config = self.prediction_logger_config
+        os.makedirs(config.log_dir, exist_ok=True)
+        self.segment_sequence += 1
+        name = f"predictions-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self.segment_sequence:04d}"
+        self.segment_path = os.path.join(config.log_dir, f"{name}.parquet")
+        self.segment_writer = pq.ParquetWriter(f"{self.segment_path}.inprogress", self.get_schema())
+        self.segment_rows = 0
+        self.segment_started = time.monotonic()
+
+    def close_segment(self):
+        if self.segment_writer is None:
+            return
+        try:
+            self.segment_writer.close()
+            os.replace(f"{self.segment_path}.inprogress", self.segment_path)
+            self.counters["segments"] += 1
+            logging.info("Closed prediction log segment %s with %s rows", self.segment_path, self.segment_rows)
+        finally:
+            self.segment_writer = None
+
+    def write(self, items):
+        config = self.prediction_logger_config
+        table = self.to_table(items)
+        if self.segment_writer is None:
+            self.open_segment()
+        # one row group per batch
+        self.segment_writer.write_table(table)
+        self.segment_rows += table.num_rows
+        with self.condition:
+            self.counters["logged"] += table.num_rows
+
+        if (self.segment_rows >= config.segment_max_rows
+                or time.monotonic() - self.segment_started >= config.segment_max_seconds):
+            self.close_segment()
+
+    def run(self):
+        while True:
+            items = self.take_batch()
+            if items:
+                try:
+                    self.write(items)
+                except Exception as e:
+                    # the batch is lost, the next one starts a new segment
+                    with self.condition:
+                        self.counters["write_errors"] += 1
+                        self.counters["dropped"] += sum(len(item[2]) for item in items)
+                    logging.error("Prediction log write failed: %s", e)
+                    try:
+                        self.close_segment()
+                    except Exception:
+                        self.segment_writer = None
+            elif (self.segment_writer is not None and time.monotonic() - self.segment_started
+                    >= self.prediction_logger_config.segment_max_seconds):
+                # an idle service still closes its segment on time
+                self.close_segment()
+
+            with self.condition:
+                if self.stopping and not self.items:
+                    break
+        self.close_segment()
+
+    def close(self, timeout=10):
+        '''Writes out the queued rows and closes the current segment.'''
+        try:
+            with self.condition:
+                self.stopping = True
+                self.condition.notify_all()
+                worker = self.worker
+            if worker is not None:
+                worker.join(timeout)
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def metrics(self):
+        with self.condition:
+            metrics = dict(self.counters)
+            metrics["queued_rows"] = self.queued_rows
+        metrics["max_queue_rows"] = self.prediction_logger_config.max_queue_rows
+        metrics["overflow_policy"] = self.prediction_logger_config.overflow_policy
+        return metrics
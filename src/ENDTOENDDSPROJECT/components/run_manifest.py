@@ -0,0 +1,122 @@
+import json
+import os
+import sys
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from importlib import metadata
+
+from src.ENDTOENDDSPROJECT.exception import CustomException
+from src.ENDTOENDDSPROJECT.logger import logging
+from src.ENDTOENDDSPROJECT.utils import compute_file_hash, compute_fingerprint, describe_estimator
+
+
+@dataclass
+class RunManifestConfig:
+    manifest_path: str = os.path.join('artifacts', 'run_manifest.json')
+    libraries: tuple = ('numpy', 'pandas', 'scipy', 'scikit-learn', 'xgboost', 'catboost')
+
+class RunManifest:
+    '''
+    Records what the last successful training run was built from: per stage
+    a hash of its own config and the content hashes of the files it read and
+    wrote. A stage only hashes its own settings, changes upstream reach it
+    through its inputs, so a new params grid invalidates training while
+    transformation and ingestion stay valid.
+    '''
+    def __init__(self):
+        self.run_manifest_config = RunManifestConfig()
+
+    def get_library_versions(self):
+        versions = {}
+        for library in self.run_manifest_config.libraries:
+            try:
+                versions[library] = metadata.version(library)
+            except metadata.PackageNotFoundError:
+                versions[library] = None
+        return versions
+
+    def compute_stage_hashes(self, data_ingestion, data_transformation, model_trainer):
+        try:
+            ingestion_config = data_ingestion.ingestion_config
+            ingestion_hash = compute_fingerprint(asdict(ingestion_config))
+
+            transformation_config = data_transformation.data_transformation_config
+            transformation_hash = compute_fingerprint(
+                describe_estimator(data_transformation.get_data_transformer_object()),
+                transformation_config.target_column_name,
+                transformation_config.sparse_output
+            )
+
+            # the worker budget and MLflow logging do not change the model
+            search_settings = {name: value for name, value in asdict(model_trainer.model_trainer_config).items()
+                               if name not in ("n_jobs", "log_to_mlflow")}
+            training_hash = compute_fingerprint(
+                describe_estimator(model_trainer.get_models()),
+                model_trainer.get_params(),
+                search_settings,
+                self.get_library_versions()
+            )
+
+            return {"ingestion": ingestion_hash, "transformation": transformation_hash, "training": training_hash}
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    @staticmethod
+    def hash_files(paths):
+        return {path: compute_file_hash(path) if os.path.exists(path) else None for path in paths}
+
+    def load(self):
+        manifest_path = self.run_manifest_config.manifest_path
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path) as file_obj:
+            return json.load(file_obj)
+
+    def first_invalid_stage(self, stages):
+        '''
+        Returns (stage, reason) for the first of stages, given in run order,
+        that has to re-run, or (None, None) when the last successful run can
+        be reused as is.
+        '''
+        manifest = self.load()
+        if manifest is None:
+            return stages[0].name, "no previous run manifest"
+
+        for stage in stages:
+            recorded = manifest["stages"].get(stage.name)
+            if recorded is None:
+                return stage.name, "not in the previous run manifest"
+            if stage.always_run:
+                return stage.name, "reads a live source on every run"
+            if recorded["hash"] != stage.config_hash:
+                return stage.name, "config changed"
+
+            # inputs changed by hand, or outputs replaced or deleted since the run
+            for kind in ("inputs", "outputs"):
+                current = self.hash_files(getattr(stage, kind))
+                for path, file_hash in current.items():
+                    if file_hash is None or recorded[kind].get(path) != file_hash:
+                        return stage.name, f"{path} changed since the last run"
+
+        return None, None
+
+    def save(self, stages):
+        manifest = {
+            "created_at": datetime.now().isoformat(),
+            "stages": {
+                stage.name: {
+                    "hash": stage.config_hash,
+                    "inputs": self.hash_files(stage.inputs),
+                    "outputs": self.hash_files(stage.outputs)
+                }
+                for stage in stages
+            }
+        }
+
+        manifest_path = self.run_manifest_config.manifest_path
+        tmp_path = f"{manifest_path}.tmp"
+        with open(tmp_path, "w") as file_obj:
+            json.dump(manifest, file_obj, indent=2)
+        os.replace(tmp_path, manifest_path)
+        logging.info("Saved run manifest to %s", manifest_path)
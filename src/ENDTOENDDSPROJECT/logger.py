@@ -1,22 +1,164 @@
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import sys
 from datetime import datetime
 
-# Set log file name
-LOG_FILE = f"{datetime.now().strftime('%m_%d_%Y_%H_%M_%S')}.log"
+# Log calls only put the record on an in-memory queue; one listener thread
+# per process formats it and writes the file, so request handlers never
+# wait on disk I/O.
+
+LOG_FORMAT = "[ %(asctime)s ] %(lineno)d %(name)s - %(levelname)s - %(message)s"
 
 # Correct log path (only one "logs" directory)
-log_path = os.path.join(os.getcwd(), "logs")
+log_path = os.getenv("LOG_DIR", os.path.join(os.getcwd(), "logs"))
 os.makedirs(log_path, exist_ok=True)
 
-LOG_FILE_PATH = os.path.join(log_path, LOG_FILE)
+LOG_TIMESTAMP = datetime.now().strftime('%m_%d_%Y_%H_%M_%S')
+# rotate after LOG_MAX_BYTES, keeping LOG_BACKUP_COUNT old files
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5))
+# "text" or "json", one object per line
+LOG_OUTPUT = os.getenv("LOG_OUTPUT", "text")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# per-module levels, e.g. "prediction_pipeline=WARNING,werkzeug=ERROR"
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+
+def get_log_file_path(pid=None):
+    # one file per process, so forked workers never share (or rotate) a file
+    return os.path.join(log_path, f"{LOG_TIMESTAMP}_{pid or os.getpid()}.log")
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "line": record.lineno,
+            "process": record.process,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    '''
+    QueueHandler for a queue read in the same process. The record is not
+    pickled, so instead of formatting it on the caller's thread like the
+    stdlib prepare, only the arguments are merged into the message (they
+    may change before the listener gets to it) and a traceback is rendered.
+    Like the stdlib, this works on a copy; other handlers of the record
+    still see the original.
+    '''
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        try:
+            self.enqueue(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+class ModuleLevelFilter(logging.Filter):
+    '''
+    Applies a level per module. Code here logs through the root logger, so
+    a key is matched against the module the call was made from
+    (record.module); third-party loggers also match by logger name, e.g.
+    "werkzeug". Records of other modules need the default level.
+    '''
+    def __init__(self, levels, default_level):
+        super().__init__()
+        self.levels = levels
+        self.default_level = default_level
+
+    def filter(self, record):
+        level = self.levels.get(record.module)
+        if level is None:
+            name = record.name
+            while name and level is None:
+                level = self.levels.get(name)
+                name = name.rpartition(".")[0]
+        return record.levelno >= (self.default_level if level is None else level)
+
+def get_level(name):
+    level = logging.getLevelName(name.strip().upper())
+    if not isinstance(level, int):
+        raise ValueError(f"Unknown log level {name!r}")
+    return level
+
+def parse_levels(spec):
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        module, _, level = item.partition("=")
+        levels[module.strip()] = get_level(level)
+    return levels
+
+def create_file_handler(pid=None):
+    handler = logging.handlers.RotatingFileHandler(
+        get_log_file_path(pid), maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8", delay=True
+    )
+    handler.setFormatter(JsonFormatter() if LOG_OUTPUT == "json" else logging.Formatter(LOG_FORMAT))
+    return handler
+
+def start_listener():
+    global log_queue, queue_listener
+    log_queue = queue.SimpleQueue()
+    queue_handler.queue = log_queue
+    queue_listener = logging.handlers.QueueListener(log_queue, create_file_handler())
+    queue_listener.start()
+
+def stop_listener():
+    # writes out everything still queued
+    global queue_listener
+    if queue_listener is not None:
+        queue_listener.stop()
+        for handler in queue_listener.handlers:
+            handler.close()
+        queue_listener = None
+
+default_level = get_level(LOG_LEVEL)
+module_levels = parse_levels(LOG_LEVELS)
+
+# silenced records are dropped before they are queued
+queue_handler = LocalQueueHandler(queue.SimpleQueue())
+queue_handler.addFilter(ModuleLevelFilter(module_levels, default_level))
+
+root_logger = logging.getLogger()
+root_logger.addHandler(queue_handler)
+# low enough for any per-module level, the filter enforces the rest
+root_logger.setLevel(min([default_level] + list(module_levels.values())))
+
+log_queue = None
+queue_listener = None
+start_listener()
+atexit.register(stop_listener)
+
+def start_child_listener():
+    start_listener()
+    # multiprocessing workers leave through os._exit, which skips atexit
+    multiprocessing_util = sys.modules.get("multiprocessing.util")
+    if multiprocessing_util is not None:
+        multiprocessing_util.Finalize(None, stop_listener, exitpriority=0)
+
+# the listener thread does not survive a fork, workers start their own
+# with their own file
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=start_child_listener)
 
-# Configure logging
-logging.basicConfig(
-    filename=LOG_FILE_PATH,
-    format="[ %(asctime)s ] %(lineno)d %(name)s - %(levelname)s - %(message)s",
-    level=logging.INFO,
-)
+LOG_FILE_PATH = get_log_file_path()
 
 # Exportable logger
 logger = logging.getLogger(__name__)
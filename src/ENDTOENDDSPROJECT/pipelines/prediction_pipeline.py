@@ -1,30 +1,332 @@
+import queue
 import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+import numpy as np
 import pandas as pd
+from dataclasses import dataclass
 from src.ENDTOENDDSPROJECT.exception import CustomException
-from src.ENDTOENDDSPROJECT.utils import load_object
+from src.ENDTOENDDSPROJECT.utils import load_object_cached, load_object_mmap, as_model_input, compute_file_hash
+from src.ENDTOENDDSPROJECT.components.artifact_store import ArtifactStore
 import os
 
+@dataclass
+class PredictPipelineConfig:
+    # used until the training pipeline has published to the artifact store
+    model_path: str = os.path.join("artifacts", "model.pkl")
+    preprocessor_path: str = os.path.join("artifacts", "preprocessor.pkl")
+    csv_chunk_size: int = 5000
+    # upper bound for a caller-chosen chunk size, memory grows with it
+    max_csv_chunk_size: int = int(os.getenv("PREDICT_MAX_CSV_CHUNK_SIZE", 50000))
+    # numpy-only model written by the export stage of the training pipeline
+    compiled_model_path: str = os.path.join("artifacts", "compiled_model.pkl")
+    use_compiled_model: bool = os.getenv("USE_COMPILED_MODEL", "1") == "1"
+    # map the arrays inside the artifacts read-only instead of copying them,
+    # so every worker process shares the same pages
+    mmap_artifacts: bool = os.getenv("MMAP_ARTIFACTS", "1") == "1"
+    # training distribution the drift monitor compares live inputs with
+    drift_reference_path: str = os.path.join("artifacts", "drift_reference.json")
+
+@dataclass
+class MicroBatchConfig:
+    # a batch is scored once it holds max_batch_size rows or its first
+    # request has waited max_wait_ms, whichever comes first
+    max_wait_ms: float = float(os.getenv("PREDICT_BATCH_WAIT_MS", 5))
+    max_batch_size: int = int(os.getenv("PREDICT_BATCH_SIZE", 64))
+    # recent batches kept for the percentile metrics
+    metrics_window: int = 1000
+
+@dataclass
+class PredictionCacheConfig:
+    max_entries: int = int(os.getenv("PREDICT_CACHE_SIZE", 10000))
+    ttl_seconds: float = float(os.getenv("PREDICT_CACHE_TTL", 3600))
+    # decimals kept of the numeric readings in the cache key
+    precision: int = int(os.getenv("PREDICT_CACHE_PRECISION", 4))
+
 class PredictPipeline:
     def __init__(self):
-        pass
+        self.predict_pipeline_config = PredictPipelineConfig()
+        self.artifact_store = ArtifactStore()
+
+    def get_artifact_paths(self):
+        '''
+        Paths of the artifacts to serve and their version, the content hashes
+        of the model and preprocessor. They come from the current bundle of
+        the artifact store, or from the files under artifacts/ when nothing
+        has been published yet.
+        '''
+        bundle = self.artifact_store.load_current_bundle()
+        if bundle is not None:
+            files = bundle["files"]
+            return {
+                "model": files["model"]["path"],
+                "preprocessor": files["preprocessor"]["path"],
+                "compiled_model": files["compiled_model"]["path"] if "compiled_model" in files else None,
+                "drift_reference": files["drift_reference"]["path"] if "drift_reference" in files else None,
+                "version": (files["model"]["sha256"], files["preprocessor"]["sha256"]),
+            }
+
+        # content hashes are recomputed only when a file changes
+        config = self.predict_pipeline_config
+        return {
+            "model": config.model_path,
+            "preprocessor": config.preprocessor_path,
+            "compiled_model": config.compiled_model_path if os.path.exists(config.compiled_model_path) else None,
+            "drift_reference": config.drift_reference_path if os.path.exists(config.drift_reference_path) else None,
+            "version": (load_object_cached(config.model_path, loader=compute_file_hash),
+                        load_object_cached(config.preprocessor_path, loader=compute_file_hash)),
+        }
+
+    def get_loader(self):
+        return load_object_mmap if self.predict_pipeline_config.mmap_artifacts else None
+
+    def load_artifacts(self, paths=None):
+        # unpickled once per process, reloaded only when the files change
+        paths = paths or self.get_artifact_paths()
+        model = load_object_cached(file_path=paths["model"], loader=self.get_loader())
+        preprocessor = load_object_cached(file_path=paths["preprocessor"], loader=self.get_loader())
+        return model, preprocessor
+
+    def get_artifact_version(self):
+        return self.get_artifact_paths()["version"]
+
+    def load_compiled_model(self, paths=None):
+        '''
+        The compiled model, or None when it is missing, disabled or was built
+        from other pickles than the ones currently served.
+        '''
+        paths = paths or self.get_artifact_paths()
+        if not self.predict_pipeline_config.use_compiled_model or paths["compiled_model"] is None:
+            return None
+        compiled = load_object_cached(file_path=paths["compiled_model"], loader=self.get_loader())
+        return compiled if compiled.source_hashes == paths["version"] else None
 
     def predict(self, features):
+        # features is a DataFrame or a list of dicts keyed by column name
         try:
-            model_path = os.path.join("artifacts", "model.pkl")
-            preprocessor_path = os.path.join("artifacts", "preprocessor.pkl")
-            
-            print("Before Loading")
-            model = load_object(file_path=model_path)
-            preprocessor = load_object(file_path=preprocessor_path)
-            print("After Loading")
-            
-            data_scaled = preprocessor.transform(features)
+            # resolved once, so every artifact below comes from the same bundle
+            paths = self.get_artifact_paths()
+            compiled = self.load_compiled_model(paths)
+            if compiled is not None and compiled.estimator is not None:
+                return compiled.predict(features)
+
+            model, preprocessor = self.load_artifacts(paths)
+            if compiled is not None:
+                data_scaled = as_model_input(model, compiled.transform(features))
+            else:
+                if not isinstance(features, pd.DataFrame):
+                    features = pd.DataFrame(features)
+                data_scaled = as_model_input(model, preprocessor.transform(features))
             preds = model.predict(data_scaled)
             return preds
         
         except Exception as e:
             raise CustomException(e, sys)
 
+    def predict_csv_in_chunks(self, file_obj, chunk_size=None):
+        '''
+        Reads a CSV with the training columns in fixed-size chunks and yields
+        (chunk, predictions) pairs, so memory stays bounded by the chunk size
+        rather than the file size.
+        '''
+        config = self.predict_pipeline_config
+        chunk_size = min(chunk_size or config.csv_chunk_size, config.max_csv_chunk_size)
+        try:
+            for chunk in pd.read_csv(file_obj, chunksize=chunk_size):
+                yield chunk, self.predict(chunk)
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+class MicroBatchPredictor:
+    '''
+    Collects the records of concurrent predict calls and scores them in one
+    PredictPipeline.predict call on a background thread. Each caller blocks
+    until its own rows come back, so it is a drop-in for PredictPipeline.predict
+    with lists of records.
+    '''
+    def __init__(self, predict_pipeline=None, config=None):
+        self.predict_pipeline = predict_pipeline or PredictPipeline()
+        self.micro_batch_config = config or MicroBatchConfig()
+        self.requests = queue.Queue()
+        self.worker = None
+        self.worker_lock = threading.Lock()
+        self.metrics_lock = threading.Lock()
+        self.batch_sizes = deque(maxlen=self.micro_batch_config.metrics_window)
+        self.queue_waits = deque(maxlen=self.micro_batch_config.metrics_window)
+        self.counters = {"requests": 0, "rows": 0, "batches": 0, "failed_batches": 0}
+
+    def start(self):
+        with self.worker_lock:
+            if self.worker is None:
+                self.worker = threading.Thread(target=self.run, name="micro-batcher", daemon=True)
+                self.worker.start()
+
+    def predict(self, records):
+        if not records:
+            return np.empty(0)
+        self.start()
+        future = Future()
+        self.requests.put((list(records), future, time.perf_counter()))
+        return future.result()
+
+    def collect_batch(self):
+        first = self.requests.get()
+        batch = [first]
+        rows = len(first[0])
+        deadline = first[2] + self.micro_batch_config.max_wait_ms / 1000
+        while rows < self.micro_batch_config.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self.requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            rows += len(item[0])
+        return batch, rows
+
+    def run(self):
+        while True:
+            batch, rows = self.collect_batch()
+            started = time.perf_counter()
+            try:
+                preds = self.predict_pipeline.predict([record for records, _, _ in batch for record in records])
+                failed = False
+            except Exception:
+                # score the requests one by one so a bad record only fails its own caller
+                preds = None
+                failed = True
+
+            offset = 0
+            for records, future, enqueued in batch:
+                if preds is not None:
+                    future.set_result(preds[offset:offset + len(records)])
+                else:
+                    try:
+                        future.set_result(self.predict_pipeline.predict(records))
+                    except Exception as e:
+                        future.set_exception(e)
+                offset += len(records)
+
+            with self.metrics_lock:
+                self.counters["requests"] += len(batch)
+                self.counters["rows"] += rows
+                self.counters["batches"] += 1
+                self.counters["failed_batches"] += failed
+                self.batch_sizes.append(rows)
+                self.queue_waits.extend((started - enqueued) * 1000 for _, _, enqueued in batch)
+
+    def metrics(self):
+        with self.metrics_lock:
+            batch_sizes = np.array(self.batch_sizes, dtype=float)
+            queue_waits = np.array(self.queue_waits, dtype=float)
+            metrics = dict(self.counters)
+
+        metrics["max_wait_ms"] = self.micro_batch_config.max_wait_ms
+        metrics["max_batch_size"] = self.micro_batch_config.max_batch_size
+        metrics["queue_depth"] = self.requests.qsize()
+        for name, values in (("batch_size", batch_sizes), ("queue_wait_ms", queue_waits)):
+            metrics[name] = {
+                "mean": float(values.mean()) if len(values) else None,
+                "p50": float(np.percentile(values, 50)) if len(values) else None,
+                "p95": float(np.percentile(values, 95)) if len(values) else None,
+                "max": float(values.max()) if len(values) else None,
+            }
+        return metrics
+
+class PredictionCache:
+    '''
+    Bounded LRU cache with a TTL in front of a predictor taking lists of
+    records (PredictPipeline or MicroBatchPredictor). Numeric readings are
+    rounded to the configured precision and the rounded record is what
+    gets scored, so a cached result is exactly what a fresh call would
+    return. The cache empties itself when the model or preprocessor pickle
+    changes.
+    '''
+    def __init__(self, predictor, predict_pipeline=None, config=None):
+        self.predictor = predictor
+        self.predict_pipeline = predict_pipeline or predictor
+        self.prediction_cache_config = config or PredictionCacheConfig()
+        self.entries = OrderedDict()
+        self.artifact_version = None
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def normalize(self, record):
+        precision = self.prediction_cache_config.precision
+        return {
+            column: round(float(value), precision) if isinstance(value, (int, float, np.number)) else value
+            for column, value in record.items()
+        }
+
+    def check_artifact_version(self):
+        version = self.predict_pipeline.get_artifact_version()
+        with self.lock:
+            if version != self.artifact_version:
+                if self.artifact_version is not None:
+                    self.counters["invalidations"] += 1
+                self.entries.clear()
+                self.artifact_version = version
+        return version
+
+    def predict(self, records):
+        version = self.check_artifact_version()
+        records = [self.normalize(record) for record in records]
+        keys = [tuple(sorted(record.items())) for record in records]
+        results = [None] * len(records)
+        now = time.monotonic()
+
+        with self.lock:
+            for index, key in enumerate(keys):
+                entry = self.entries.get(key)
+                if entry is not None and entry[1] <= now:
+                    del self.entries[key]
+                    self.counters["expirations"] += 1
+                    entry = None
+                if entry is None:
+                    self.counters["misses"] += 1
+                    continue
+                self.entries.move_to_end(key)
+                self.counters["hits"] += 1
+                results[index] = entry[0]
+
+        # repeats within one call are scored once
+        missing = {}
+        for index, result in enumerate(results):
+            if result is None:
+                missing.setdefault(keys[index], []).append(index)
+        if missing:
+            preds = self.predictor.predict([records[indices[0]] for indices in missing.values()])
+            expires_at = time.monotonic() + self.prediction_cache_config.ttl_seconds
+            with self.lock:
+                # a model swapped while scoring must not leave stale entries behind
+                store = version == self.artifact_version
+                for (key, indices), pred in zip(missing.items(), preds):
+                    for index in indices:
+                        results[index] = pred
+                    if store:
+                        self.entries[key] = (pred, expires_at)
+                        self.entries.move_to_end(key)
+                while len(self.entries) > self.prediction_cache_config.max_entries:
+                    self.entries.popitem(last=False)
+                    self.counters["evictions"] += 1
+
+        return np.array(results)
+
+    def metrics(self):
+        with self.lock:
+            metrics = dict(self.counters)
+            metrics["size"] = len(self.entries)
+        lookups = metrics["hits"] + metrics["misses"]
+        metrics["hit_rate"] = metrics["hits"] / lookups if lookups else None
+        metrics["max_entries"] = self.prediction_cache_config.max_entries
+        metrics["ttl_seconds"] = self.prediction_cache_config.ttl_seconds
+        return metrics
+
 class CustomData:
     def __init__(self,
                  district: str,
@@ -43,19 +345,45 @@ class CustomData:
         self.phosphorus_content = phosphorus_content
         self.potassium_content = potassium_content
 
+    @classmethod
+    def from_dict(cls, payload):
+        # payload uses the same field names as the home.html form
+        return cls(
+            district=str(payload["district"]),
+            soil_type=str(payload["soil_type"]),
+            ph_level=float(payload["ph_level"]),
+            organic_matter=float(payload["organic_matter"]),
+            nitrogen_content=float(payload["nitrogen_content"]),
+            phosphorus_content=float(payload["phosphorus_content"]),
+            potassium_content=float(payload["potassium_content"])
+        )
+
+    def get_data_as_dict(self):
+        return {
+            "District": self.district,
+            "Soil Type": self.soil_type,
+            "pH Level": self.ph_level,
+            "Organic Matter (%)": self.organic_matter,
+            "Nitrogen Content (kg/ha)": self.nitrogen_content,
+            "Phosphorus Content (kg/ha)": self.phosphorus_content,
+            "Potassium Content (kg/ha)": self.potassium_content,
+        }
+
     def get_data_as_data_frame(self):
         try:
-            custom_data_input_dict = {
-                "District": [self.district],
-                "Soil Type": [self.soil_type],
-                "pH Level": [self.ph_level],
-                "Organic Matter (%)": [self.organic_matter],
-                "Nitrogen Content (kg/ha)": [self.nitrogen_content],
-                "Phosphorus Content (kg/ha)": [self.phosphorus_content],
-                "Potassium Content (kg/ha)": [self.potassium_content],
-            }
+            return pd.DataFrame([self.get_data_as_dict()])
 
-            return pd.DataFrame(custom_data_input_dict)
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    @staticmethod
+    def get_batch_as_data_frame(data_list):
+        '''
+        Builds a single DataFrame for many samples so the whole batch goes
+        through preprocessor.transform and model.predict in one call.
+        '''
+        try:
+            return pd.DataFrame([data.get_data_as_dict() for data in data_list])
 
         except Exception as e:
             raise CustomException(e, sys)
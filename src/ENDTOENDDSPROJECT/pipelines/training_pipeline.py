@@ -0,0 +1,366 @@
+import json
+import os
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from typing import Callable, List
+
+from src.ENDTOENDDSPROJECT.exception import CustomException
+from src.ENDTOENDDSPROJECT.logger import logging
+from src.ENDTOENDDSPROJECT.components.data_ingestion import DataIngestion
+from src.ENDTOENDDSPROJECT.components.data_transformation import DataTransformation
+from src.ENDTOENDDSPROJECT.components.model_tranier import ModelTrainer
+from src.ENDTOENDDSPROJECT.components.model_compiler import ModelCompiler
+from src.ENDTOENDDSPROJECT.components.model_monitering import ModelMonitor
+from src.ENDTOENDDSPROJECT.components.run_manifest import RunManifest
+from src.ENDTOENDDSPROJECT.components.artifact_store import ArtifactStore
+from src.ENDTOENDDSPROJECT.utils import (
+    compute_file_hash, compute_fingerprint, load_object, as_model_input, copy_path, replace_path
+)
+
+
+@dataclass
+class TrainingPipelineConfig:
+    stage_cache_dir: str = os.path.join('artifacts', 'stage_cache')
+    # cached runs kept per stage, the oldest are pruned first
+    max_cache_entries: int = 3
+    max_workers: int = int(os.getenv("TRAINING_PIPELINE_WORKERS", 2))
+    train_transformed_prefix: str = os.path.join('artifacts', 'train_transformed')
+    test_transformed_prefix: str = os.path.join('artifacts', 'test_transformed')
+    evaluation_metrics_path: str = os.path.join('artifacts', 'evaluation_metrics.json')
+
+@dataclass
+class Stage:
+    name: str
+    func: Callable
+    # files read and written by the stage; inputs produced by another stage
+    # are only hashed once that stage has finished
+    inputs: List[str] = field(default_factory=list)
+    outputs: List[str] = field(default_factory=list)
+    depends_on: List[str] = field(default_factory=list)
+    # hash of the stage's own settings; whatever upstream decides its
+    # outputs reaches it through the content of its inputs
+    config_hash: str = ""
+    # for stages reading a source that cannot be hashed, e.g. a live table
+    always_run: bool = False
+
+class StageRunner:
+    '''
+    Runs stages in dependency order, starting every stage whose dependencies
+    are done so independent stages run side by side. The outputs of each
+    finished stage are copied to stage_cache/<stage>/<fingerprint>/, where
+    the fingerprint covers the stage config and the content of its inputs.
+    A stage whose fingerprint is cached is restored instead of re-run, so
+    after a crash the next run resumes at the stage that failed. Stages
+    marked always_run skip the lookup.
+    '''
+    MANIFEST_NAME = "manifest.json"
+
+    def __init__(self, stages, cache_dir, max_workers=2, max_cache_entries=3):
+        self.stages = {stage.name: stage for stage in stages}
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.max_cache_entries = max_cache_entries
+
+        for stage in stages:
+            missing = [name for name in stage.depends_on if name not in self.stages]
+            if missing:
+                raise ValueError(f"Stage {stage.name} depends on unknown stages {missing}")
+
+    def get_fingerprint(self, stage):
+        input_hashes = {path: compute_file_hash(path) if os.path.exists(path) else None
+                        for path in stage.inputs}
+        return compute_fingerprint(stage.name, stage.config_hash, input_hashes)
+
+    def get_entry_dir(self, stage, fingerprint):
+        return os.path.join(self.cache_dir, stage.name, fingerprint)
+
+    def load_entry(self, stage, fingerprint):
+        manifest_path = os.path.join(self.get_entry_dir(stage, fingerprint), self.MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path) as file_obj:
+            manifest = json.load(file_obj)
+        if sorted(manifest["outputs"]) != sorted(stage.outputs):
+            return None
+        return manifest
+
+    def restore_entry(self, stage, fingerprint, manifest):
+        '''
+        Puts the cached outputs back in place. Outputs that already match the
+        cache are left alone, so an unchanged run does not touch any file.
+        '''
+        entry_dir = self.get_entry_dir(stage, fingerprint)
+        restored = 0
+        for index, (path, output_hash) in enumerate(manifest["outputs"].items()):
+            if os.path.exists(path) and compute_file_hash(path) == output_hash:
+                continue
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            if os.path.isdir(tmp_path):
+                shutil.rmtree(tmp_path)
+            copy_path(os.path.join(entry_dir, str(index)), tmp_path)
+            replace_path(tmp_path, path)
+            restored += 1
+        os.utime(entry_dir)
+        return restored
+
+    def save_entry(self, stage, fingerprint):
+        missing = [path for path in stage.outputs if not os.path.exists(path)]
+        if missing:
+            raise FileNotFoundError(f"Stage {stage.name} did not write its outputs {missing}")
+
+        stage_dir = os.path.join(self.cache_dir, stage.name)
+        entry_dir = self.get_entry_dir(stage, fingerprint)
+        tmp_dir = f"{entry_dir}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        outputs = {}
+        for index, path in enumerate(stage.outputs):
+            copy_path(path, os.path.join(tmp_dir, str(index)))
+            outputs[path] = compute_file_hash(path)
+        with open(os.path.join(tmp_dir, self.MANIFEST_NAME), "w") as file_obj:
+            json.dump({"stage": stage.name, "created_at": datetime.now().isoformat(),
+                       "outputs": outputs}, file_obj, indent=2)
+
+        # the entry only appears once it is complete
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(tmp_dir, entry_dir)
+        self.prune(stage_dir)
+
+    def prune(self, stage_dir):
+        entries = [os.path.join(stage_dir, name) for name in os.listdir(stage_dir) if ".tmp-" not in name]
+        entries.sort(key=os.path.getmtime, reverse=True)
+        for entry_dir in entries[self.max_cache_entries:]:
+            shutil.rmtree(entry_dir, ignore_errors=True)
+
+    def run_stage(self, stage):
+        fingerprint = self.get_fingerprint(stage)
+        manifest = None if stage.always_run else self.load_entry(stage, fingerprint)
+        if manifest is not None:
+            restored = self.restore_entry(stage, fingerprint, manifest)
+            logging.info("Stage %s is cached (%s), restored %s outputs", stage.name, fingerprint[:12], restored)
+            return "cached"
+
+        logging.info("Running stage %s (%s)", stage.name, fingerprint[:12])
+        stage.func()
+        self.save_entry(stage, fingerprint)
+        logging.info("Stage %s finished", stage.name)
+        return "ran"
+
+    def run(self):
+        try:
+            results = {}
+            pending = dict(self.stages)
+            running = {}
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                while pending or running:
+                    for name, stage in list(pending.items()):
+                        if all(dependency in results for dependency in stage.depends_on):
+                            running[executor.submit(self.run_stage, stage)] = name
+                            del pending[name]
+
+                    if not running:
+                        raise ValueError(f"Stages {sorted(pending)} have a dependency cycle")
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name = running.pop(future)
+                        # the stages already running finish before the error surfaces
+                        results[name] = future.result()
+
+            return results
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+class TrainingPipeline:
+    def __init__(self):
+        self.training_pipeline_config = TrainingPipelineConfig()
+        self.data_ingestion = DataIngestion()
+        self.data_transformation = DataTransformation()
+        self.model_trainer = ModelTrainer()
+        # MLflow runs in the evaluation stage, so a logging failure keeps the model
+        self.model_trainer.model_trainer_config.log_to_mlflow = False
+        self.model_compiler = ModelCompiler()
+        self.model_monitor = ModelMonitor()
+        self.run_manifest = RunManifest()
+        self.artifact_store = ArtifactStore()
+
+    def get_transformed_paths(self, prefix):
+        if self.data_transformation.data_transformation_config.sparse_output:
+            return [f"{prefix}_X.npz", f"{prefix}_y.npy"]
+        return [f"{prefix}_arr.npy"]
+
+    def run_ingestion(self):
+        self.data_ingestion.initiate_data_ingestion()
+
+    def run_transformation(self):
+        ingestion_config = self.data_ingestion.ingestion_config
+        train_data, test_data, _ = self.data_transformation.initiate_data_transformation(
+            ingestion_config.train_data_path, ingestion_config.test_data_path
+        )
+        DataTransformation.save_split(self.training_pipeline_config.train_transformed_prefix, train_data)
+        DataTransformation.save_split(self.training_pipeline_config.test_transformed_prefix, test_data)
+
+    def run_monitoring(self):
+        transformation_config = self.data_transformation.data_transformation_config
+        self.model_monitor.initiate_drift_reference(
+            self.data_ingestion.ingestion_config.train_data_path,
+            transformation_config.numerical_columns,
+            transformation_config.categorical_columns
+        )
+
+    def run_training(self):
+        train_data = DataTransformation.load_split(self.training_pipeline_config.train_transformed_prefix)
+        test_data = DataTransformation.load_split(self.training_pipeline_config.test_transformed_prefix)
+        r2_square = self.model_trainer.initiate_model_trainer(train_data, test_data)
+        logging.info("Best model test R2 score: %s", r2_square)
+
+    def run_evaluation(self):
+        trainer_config = self.model_trainer.model_trainer_config
+        best_model = load_object(trainer_config.trained_model_file_path)
+        with open(trainer_config.model_report_file_path) as file_obj:
+            model_report = json.load(file_obj)
+
+        test_data = DataTransformation.load_split(self.training_pipeline_config.test_transformed_prefix)
+        if isinstance(test_data, tuple):
+            X_test, y_test = test_data
+        else:
+            X_test, y_test = test_data[:, :-1], test_data[:, -1]
+        X_test = as_model_input(best_model, X_test)
+
+        best_model_name = model_report["best_model_name"]
+        best_params = self.model_trainer.get_params()[best_model_name]
+        rmse, mae, r2 = self.model_trainer.log_to_mlflow(best_model, best_model_name, best_params, X_test, y_test)
+
+        with open(self.training_pipeline_config.evaluation_metrics_path, "w") as file_obj:
+            json.dump({"model_name": best_model_name, "rmse": float(rmse), "mae": float(mae), "r2": float(r2)},
+                      file_obj, indent=2)
+
+    def run_export(self):
+        self.model_compiler.initiate_model_export(
+            self.data_transformation.data_transformation_config.preprocessor_obj_file_path,
+            self.model_trainer.model_trainer_config.trained_model_file_path,
+            self.data_ingestion.ingestion_config.test_data_path,
+            self.data_transformation.data_transformation_config.target_column_name
+        )
+
+    def publish_artifacts(self, stage_hashes):
+        # serving reads the store, so it switches to the new model and
+        # preprocessor together once every stage has succeeded
+        return self.artifact_store.publish(
+            {
+                "model": self.model_trainer.model_trainer_config.trained_model_file_path,
+                "preprocessor": self.data_transformation.data_transformation_config.preprocessor_obj_file_path,
+                "compiled_model": self.model_compiler.model_compiler_config.compiled_model_file_path,
+                "drift_reference": self.model_monitor.model_monitor_config.drift_reference_file_path,
+            },
+            metadata={"stage_hashes": stage_hashes}
+        )
+
+    def get_stages(self, stage_hashes):
+        config = self.training_pipeline_config
+        ingestion_config = self.data_ingestion.ingestion_config
+        trainer_config = self.model_trainer.model_trainer_config
+
+        ingestion_outputs = [ingestion_config.raw_data_path, ingestion_config.train_data_path,
+                             ingestion_config.test_data_path]
+        if ingestion_config.incremental:
+            ingestion_outputs.append(ingestion_config.watermark_path)
+        transformation_config = self.data_transformation.data_transformation_config
+        monitor_config = self.model_monitor.model_monitor_config
+        transformed_outputs = (self.get_transformed_paths(config.train_transformed_prefix)
+                               + self.get_transformed_paths(config.test_transformed_prefix))
+        training_outputs = [trainer_config.trained_model_file_path, trainer_config.model_report_file_path]
+
+        return [
+            Stage(
+                name="ingestion",
+                func=self.run_ingestion,
+                inputs=[ingestion_config.source_data_path] if ingestion_config.source == "csv" else [],
+                outputs=ingestion_outputs,
+                config_hash=stage_hashes["ingestion"],
+                always_run=ingestion_config.source != "csv"
+            ),
+            Stage(
+                name="transformation",
+                func=self.run_transformation,
+                inputs=[ingestion_config.train_data_path, ingestion_config.test_data_path],
+                outputs=[transformation_config.preprocessor_obj_file_path]
+                        + transformed_outputs,
+                depends_on=["ingestion"],
+                config_hash=stage_hashes["transformation"]
+            ),
+            # training distribution for the drift monitor, next to transformation
+            Stage(
+                name="monitoring",
+                func=self.run_monitoring,
+                inputs=[ingestion_config.train_data_path],
+                outputs=[monitor_config.drift_reference_file_path],
+                depends_on=["ingestion"],
+                config_hash=compute_fingerprint(monitor_config.n_bins,
+                                                monitor_config.max_categories,
+                                                transformation_config.numerical_columns,
+                                                transformation_config.categorical_columns)
+            ),
+            Stage(
+                name="training",
+                func=self.run_training,
+                inputs=transformed_outputs,
+                outputs=training_outputs,
+                depends_on=["transformation"],
+                config_hash=stage_hashes["training"]
+            ),
+            Stage(
+                name="evaluation",
+                func=self.run_evaluation,
+                inputs=training_outputs + self.get_transformed_paths(config.test_transformed_prefix),
+                outputs=[config.evaluation_metrics_path],
+                depends_on=["training"],
+                config_hash=compute_fingerprint("mlflow", self.model_trainer.get_params())
+            ),
+            # independent of evaluation, the two run side by side
+            Stage(
+                name="export",
+                func=self.run_export,
+                inputs=[transformation_config.preprocessor_obj_file_path,
+                        trainer_config.trained_model_file_path, ingestion_config.test_data_path],
+                outputs=[self.model_compiler.model_compiler_config.compiled_model_file_path],
+                depends_on=["transformation", "training"],
+                config_hash=compute_fingerprint(asdict(self.model_compiler.model_compiler_config),
+                                                transformation_config.target_column_name)
+            ),
+        ]
+
+    def run(self):
+        try:
+            logging.info("The training pipeline has started")
+            stage_hashes = self.run_manifest.compute_stage_hashes(
+                self.data_ingestion, self.data_transformation, self.model_trainer
+            )
+            stages = self.get_stages(stage_hashes)
+            stage, reason = self.run_manifest.first_invalid_stage(stages)
+            if stage is None:
+                logging.info("Nothing changed since the last run, every stage is cached")
+            else:
+                logging.info("First invalid stage: %s (%s)", stage, reason)
+
+            runner = StageRunner(
+                stages,
+                cache_dir=self.training_pipeline_config.stage_cache_dir,
+                max_workers=self.training_pipeline_config.max_workers,
+                max_cache_entries=self.training_pipeline_config.max_cache_entries
+            )
+            results = runner.run()
+            self.run_manifest.save(stages)
+            self.publish_artifacts(stage_hashes)
+            logging.info("The training pipeline has finished: %s", results)
+            return results
+
+        except Exception as e:
+            raise CustomException(e, sys)
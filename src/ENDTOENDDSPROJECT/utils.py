@@ -1,84 +1,866 @@
+import copy
+import hashlib
+import json
 import os
+import shutil
 import sys
+from contextlib import contextmanager
 from src.ENDTOENDDSPROJECT.exception import CustomException
 from src.ENDTOENDDSPROJECT.logger import logging
 import pandas as pd
-from dotenv import load_dotenv
-from sklearn.model_selection import GridSearchCV
-from sklearn.metrics import r2_score
-import pymysql
 
 import pickle
+import queue
+import struct
+import threading
+import time
 import numpy as np
 
-load_dotenv()
+# Serving imports this module too, so training-only dependencies (sklearn
+# model selection, joblib, pymysql, dotenv) are imported inside the
+# functions that use them.
 
-host=os.getenv("host")
-user=os.getenv("user")
-password=os.getenv("password")
-db=os.getenv('db')
 
+class ConnectionPool:
+    '''
+    Small thread-safe pool of DB-API connections. `connect` is any callable
+    returning a new connection (pymysql in production, sqlite3 in tests).
+    '''
+    def __init__(self, connect, max_idle=4, paramstyle="pyformat"):
+        self._connect = connect
+        self._idle = queue.LifoQueue(maxsize=max_idle)
+        self.paramstyle = paramstyle
 
+    @property
+    def placeholder(self):
+        # query parameter marker of the underlying driver
+        return "?" if self.paramstyle == "qmark" else "%s"
 
-def read_sql_data():
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+
+        try:
+            yield conn
+        except BaseException:
+            # the connection may be left mid-result, never hand it out again
+            conn.close()
+            raise
+
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+_sql_connection_pool = None
+_sql_connection_pool_lock = threading.Lock()
+
+def get_sql_connection_pool():
+    '''
+    Process-wide pool for the MySQL database configured in .env. Connections
+    use an unbuffered server-side cursor so results are streamed, not loaded.
+    '''
+    global _sql_connection_pool
+    with _sql_connection_pool_lock:
+        if _sql_connection_pool is None:
+            import pymysql
+            from dotenv import load_dotenv
+
+            load_dotenv()
+            host=os.getenv("host")
+            user=os.getenv("user")
+            password=os.getenv("password")
+            db=os.getenv('db')
+
+            _sql_connection_pool = ConnectionPool(lambda: pymysql.connect(
+                host=host,
+                user=user,
+                password=password,
+                db=db,
+                cursorclass=pymysql.cursors.SSCursor
+            ), paramstyle=pymysql.paramstyle)
+        return _sql_connection_pool
+
+def read_sql_data_chunks(query, chunk_size=10000, pool=None, params=None):
+    '''
+    Yields the query result as DataFrames of at most chunk_size rows over a
+    pooled connection, so memory does not grow with the table size.
+    '''
+    pool = pool or get_sql_connection_pool()
+    try:
+        with pool.connection() as conn:
+            yield from pd.read_sql_query(query, conn, params=params, chunksize=chunk_size)
+
+    except Exception as ex:
+        raise CustomException(ex, sys)
+
+def read_sql_data(pool=None):
     logging.info("Reading SQL database started")
     try:
-        mydb=pymysql.connect(
-            host=host,
-            user=user,
-            password=password,
-            db=db
-        )
-        logging.info("Connection Established",mydb)
-        df=pd.read_sql_query('Select * from students',mydb)
+        df=pd.concat(read_sql_data_chunks('Select * from students', pool=pool), ignore_index=True)
         print(df.head())
 
         return df
 
+    except Exception as ex:
+        raise CustomException(ex, sys)
 
+# start of files written by save_object with a compression codec
+CHECKSUMMED_MAGIC = b"EDSOBJ\x00\x01"
 
-    except Exception as ex:
-        raise CustomException(ex)
-    
-def save_object(file_path, obj):
+def _zlib_codec():
+    import zlib
+    return (lambda data: zlib.compress(data, 1)), (lambda data: bytearray(zlib.decompress(data)))
+
+def _lz4_codec():
+    import lz4.frame
+    return lz4.frame.compress, (lambda data: lz4.frame.decompress(data, return_bytearray=True))
+
+def _zstd_codec():
+    import zstandard
+    return ((lambda data: zstandard.ZstdCompressor(level=1).compress(data)),
+            (lambda data: bytearray(zstandard.ZstdDecompressor().decompress(data))))
+
+# name -> factory of (compress, decompress); decompress returns a writable
+# buffer so the unpickled arrays are writable too
+COMPRESSION_CODECS = {
+    "none": lambda: (lambda data: data, lambda data: data),
+    "zlib": _zlib_codec,
+    "lz4": _lz4_codec,
+    "zstd": _zstd_codec,
+}
+
+def get_compression_codec(name, fallback="zlib"):
+    '''
+    Returns (name, compress, decompress). lz4 and zstandard are optional; when
+    the one asked for is not installed, fallback is used instead (pass None
+    to raise).
+    '''
+    if name not in COMPRESSION_CODECS:
+        raise ValueError(f"Unknown compression {name!r}, expected one of {tuple(COMPRESSION_CODECS)}")
+    try:
+        return (name,) + COMPRESSION_CODECS[name]()
+    except ImportError:
+        if fallback is None:
+            raise
+        logging.warning("%s compression is not installed, using %s", name, fallback)
+        return (fallback,) + COMPRESSION_CODECS[fallback]()
+
+def _checksum_digest(fields):
+    # the header fields besides the digest, in a canonical form
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode())
+
+def _dump_checksummed(obj, file_obj, compression):
+    '''
+    Pickle protocol 5 with the large buffers (numpy array data) kept out of
+    band: the pickle stream and every buffer are compressed as separate
+    sections, so no buffer is ever copied into the stream. The header
+    records the codec, the section sizes and a sha256 of those fields and
+    everything after the header.
+    '''
+    codec, compress, _ = get_compression_codec(compression)
+    buffers = []
+    stream = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+    sections = [compress(section) for section in [stream] + [buffer.raw() for buffer in buffers]]
+
+    fields = {"codec": codec, "protocol": 5, "sections": [len(section) for section in sections]}
+    digest = _checksum_digest(fields)
+    for section in sections:
+        digest.update(section)
+    header = json.dumps(dict(fields, sha256=digest.hexdigest())).encode()
+
+    file_obj.write(CHECKSUMMED_MAGIC)
+    file_obj.write(struct.pack("<I", len(header)))
+    file_obj.write(header)
+    for section in sections:
+        file_obj.write(section)
+
+def _load_checksummed(file_path):
+    with open(file_path, "rb") as file_obj:
+        data = bytearray(os.path.getsize(file_path))
+        file_obj.readinto(data)
+
+    corrupt = ValueError(f"Checksum mismatch in {file_path}, the file is corrupt or truncated")
+    offset = len(CHECKSUMMED_MAGIC)
+    try:
+        (header_length,) = struct.unpack_from("<I", data, offset)
+        offset += 4
+        header = json.loads(bytes(data[offset:offset + header_length]))
+        offset += header_length
+        fields = {name: header[name] for name in ("codec", "protocol", "sections")}
+        expected = header["sha256"]
+        if not all(isinstance(length, int) and length >= 0 for length in fields["sections"]):
+            raise ValueError("invalid section lengths")
+    except (struct.error, ValueError, KeyError, TypeError) as e:
+        # UnicodeDecodeError and JSONDecodeError are ValueErrors
+        raise corrupt from e
+
+    body = memoryview(data)[offset:]
+    digest = _checksum_digest(fields)
+    digest.update(body)
+    if digest.hexdigest() != expected or sum(fields["sections"]) != len(body):
+        raise corrupt
+
+    _, _, decompress = get_compression_codec(fields["codec"], fallback=None)
+    sections = []
+    for length in fields["sections"]:
+        sections.append(decompress(body[:length]))
+        body = body[length:]
+    return pickle.loads(sections[0], buffers=sections[1:])
+
+def save_object(file_path, obj, compression=None):
+    '''
+    Without compression the object is written with joblib, which stores the
+    numpy arrays inside it as raw, aligned blocks so load_object can
+    memory-map them. With compression ("none", "zlib", "lz4" or "zstd") it
+    is written as a checksummed protocol 5 pickle instead, see
+    _dump_checksummed; "none" only adds the checksum.
+    '''
     try:
         dir_path = os.path.dirname(file_path)
 
         os.makedirs(dir_path, exist_ok=True)
 
-        with open(file_path, "wb") as file_obj:
-            pickle.dump(obj, file_obj)
+        # readers see the old file or the new one, never a partial write
+        tmp_path = f"{file_path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        if compression is None:
+            import joblib
+            joblib.dump(obj, tmp_path)
+        else:
+            with open(tmp_path, "wb") as file_obj:
+                _dump_checksummed(obj, file_obj, compression)
+        os.replace(tmp_path, file_path)
 
     except Exception as e:
         raise CustomException(e, sys)
 
-def load_object(file_path):
+def load_object(file_path, mmap_mode=None):
+    '''
+    Loads any file written by save_object as well as plain pickles, telling
+    them apart by the header. With mmap_mode="r" the arrays of a joblib file
+    are mapped read-only, so worker processes share one page cache copy;
+    compressed files are always read into memory. Objects that copy their
+    arrays on unpickling (sklearn trees do) still get their own copy.
+    '''
     try:
         with open(file_path, "rb") as file_obj:
-            return pickle.load(file_obj)
+            magic = file_obj.read(len(CHECKSUMMED_MAGIC))
+        if magic == CHECKSUMMED_MAGIC:
+            return _load_checksummed(file_path)
+
+        import joblib
+
+        return joblib.load(file_path, mmap_mode=mmap_mode)
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+def load_object_mmap(file_path):
+    # loader for load_object_cached when the arrays should be shared
+    return load_object(file_path, mmap_mode="r")
+
+DATASET_FORMATS = ("csv", "parquet", "feather")
+
+def get_dataset_format(file_path):
+    file_format = os.path.splitext(file_path)[1].lstrip(".").lower()
+    if file_format not in DATASET_FORMATS:
+        raise ValueError(f"Unsupported dataset format {file_format!r}, expected one of {DATASET_FORMATS}")
+    return file_format
+
+def get_dataset_parts(file_path):
+    '''
+    The files of a split in order: the file itself, or the part files of a
+    split append_dataset turned into a directory.
+    '''
+    if not os.path.isdir(file_path):
+        return [file_path]
+    return [os.path.join(file_path, name) for name in sorted(os.listdir(file_path)) if name.startswith("part-")]
+
+def write_dataset(df, file_path, categorical_columns=()):
+    '''
+    Writes a split in the format given by its extension. The columnar formats
+    keep dtypes and store `categorical_columns` as pandas categoricals.
+    '''
+    try:
+        file_format = get_dataset_format(file_path)
+        if os.path.isdir(file_path):
+            shutil.rmtree(file_path)
+        if file_format == "csv":
+            df.to_csv(file_path, index=False, header=True)
+            return
+
+        df = df.astype({column: "category" for column in categorical_columns if column in df.columns})
+        if file_format == "parquet":
+            df.to_parquet(file_path, index=False)
+        else:
+            df.reset_index(drop=True).to_feather(file_path)
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+def read_dataset(file_path, columns=None):
+    '''
+    Reads a split written by write_dataset or append_dataset, loading only
+    `columns` when given.
+    '''
+    try:
+        if os.path.isdir(file_path):
+            parts = [read_dataset(part, columns=columns) for part in get_dataset_parts(file_path)]
+            # parts carry their own categories, concat falls back to object
+            categorical = [column for column in parts[0].columns
+                           if isinstance(parts[0][column].dtype, pd.CategoricalDtype)]
+            return pd.concat(parts, ignore_index=True).astype({column: "category" for column in categorical})
+
+        file_format = get_dataset_format(file_path)
+        if file_format == "csv":
+            return pd.read_csv(file_path, usecols=columns)
+        if file_format == "parquet":
+            return pd.read_parquet(file_path, columns=columns)
+        return pd.read_feather(file_path, columns=columns)
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+def append_dataset(df, file_path, categorical_columns=()):
+    '''
+    Adds rows to an existing split without reading it. CSV is appended in
+    place; Parquet and Feather have no append, so the split becomes a
+    directory of part files and every call adds one part.
+    '''
+    try:
+        if not os.path.exists(file_path):
+            write_dataset(df, file_path, categorical_columns)
+            return
+
+        file_format = get_dataset_format(file_path)
+        if file_format == "csv":
+            header = pd.read_csv(file_path, nrows=0).columns
+            df[list(header)].to_csv(file_path, mode="a", header=False, index=False)
+            return
+
+        if not os.path.isdir(file_path):
+            # the existing file is moved in as the first part, not rewritten
+            tmp_path = f"{file_path}.tmp-{os.getpid()}"
+            os.replace(file_path, tmp_path)
+            os.makedirs(file_path)
+            os.replace(tmp_path, os.path.join(file_path, f"part-00000.{file_format}"))
+
+        index = len(get_dataset_parts(file_path))
+        # hidden until complete, readers only list part-* files
+        tmp_path = os.path.join(file_path, f".tmp-{index:05d}.{file_format}")
+        write_dataset(df, tmp_path, categorical_columns)
+        os.replace(tmp_path, os.path.join(file_path, f"part-{index:05d}.{file_format}"))
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+class DatasetWriter:
+    '''
+    Appends DataFrame chunks to one split file so a split never has to be held
+    in memory. CSV is appended to, Parquet is written one row group per chunk
+    with `categorical_columns` dictionary encoded, and Feather is written as
+    one record batch per chunk (with categoricals as plain strings, since the
+    Arrow file format cannot change dictionaries between batches).
+    '''
+    def __init__(self, file_path, categorical_columns=()):
+        self.file_path = file_path
+        self.file_format = get_dataset_format(file_path)
+        # a split append_dataset turned into parts is replaced as a whole
+        if os.path.isdir(file_path):
+            shutil.rmtree(file_path)
+        self.categorical_columns = categorical_columns
+        self.rows_written = 0
+        self._schema = None
+        self._writer = None
+
+    def _to_table(self, df):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        df = df.astype({column: str for column in self.categorical_columns if column in df.columns})
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self.file_format == "parquet":
+            for column in self.categorical_columns:
+                if column in table.column_names:
+                    index = table.schema.get_field_index(column)
+                    table = table.set_column(index, column, pc.dictionary_encode(table[column]))
+
+        if self._schema is None:
+            self._schema = table.schema
+        # later chunks may infer slightly different types (e.g. all-null columns)
+        return table.cast(self._schema)
+
+    def write(self, df):
+        if self.file_format == "csv":
+            df.to_csv(self.file_path, mode="a" if self.rows_written else "w",
+                      header=not self.rows_written, index=False)
+        else:
+            table = self._to_table(df)
+            if self._writer is None:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+
+                if self.file_format == "parquet":
+                    self._writer = pq.ParquetWriter(self.file_path, self._schema)
+                else:
+                    self._writer = pa.ipc.new_file(self.file_path, self._schema)
+            self._writer.write_table(table)
+
+        self.rows_written += len(df)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def compute_file_hash(file_path, chunk_size=1 << 20):
+    if os.path.isdir(file_path):
+        # a directory hashes as the names and contents of its files
+        hasher = hashlib.sha256()
+        for name in sorted(os.listdir(file_path)):
+            if not name.startswith("."):
+                hasher.update(name.encode())
+                hasher.update(compute_file_hash(os.path.join(file_path, name), chunk_size).encode())
+        return hasher.hexdigest()
+
+    hasher = hashlib.sha256()
+    with open(file_path, "rb") as file_obj:
+        for block in iter(lambda: file_obj.read(chunk_size), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+def copy_path(src, dst):
+    # outputs such as split directories are copied whole
+    if os.path.isdir(src):
+        shutil.copytree(src, dst)
+    else:
+        shutil.copyfile(src, dst)
+
+def replace_path(src, dst):
+    '''
+    os.replace that also swaps a file for a directory or back. A directory
+    on either side is moved aside first, so that case is not atomic.
+    '''
+    if os.path.isdir(src) or os.path.isdir(dst):
+        old_path = f"{dst}.old-{os.getpid()}"
+        if os.path.lexists(dst):
+            os.replace(dst, old_path)
+        os.replace(src, dst)
+        if os.path.isdir(old_path):
+            shutil.rmtree(old_path)
+        elif os.path.exists(old_path):
+            os.remove(old_path)
+    else:
+        os.replace(src, dst)
+
+def describe_estimator(obj):
+    '''
+    JSON friendly description of an unfitted estimator and its (nested)
+    params. Unlike repr it is never truncated, so it is safe to hash.
+    '''
+    if hasattr(obj, "get_params") and not isinstance(obj, type):
+        return {
+            "class": f"{type(obj).__module__}.{type(obj).__qualname__}",
+            "params": {name: describe_estimator(value) for name, value in sorted(obj.get_params(deep=False).items())},
+        }
+    if isinstance(obj, (list, tuple)):
+        return [describe_estimator(value) for value in obj]
+    if isinstance(obj, dict):
+        return {str(name): describe_estimator(value) for name, value in obj.items()}
+    if obj is None or isinstance(obj, (str, int, float, bool)):
+        return obj
+    return repr(obj)
+
+def compute_fingerprint(*parts):
+    hasher = hashlib.sha256()
+    for part in parts:
+        hasher.update(json.dumps(part, sort_keys=True, default=repr).encode("utf-8"))
+    return hasher.hexdigest()
+
+_object_cache = {}
+_object_cache_lock = threading.Lock()
+
+def load_object_cached(file_path, loader=None):
+    '''
+    Process-wide cache around load_object. An entry is keyed by the absolute
+    path and reused while the file's inode, mtime and size are unchanged, so
+    a replaced artifact is picked up on the next call without a restart.
+    loader swaps load_object for another function of the path, e.g.
+    compute_file_hash to hash a file once per version.
+    '''
+    try:
+        loader = loader or load_object
+        path = os.path.abspath(file_path)
+        key = (path, loader)
+        stat = os.stat(path)
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+        entry = _object_cache.get(key)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+
+        with _object_cache_lock:
+            # another thread may have loaded it while we waited for the lock
+            entry = _object_cache.get(key)
+            if entry is not None and entry[0] == signature:
+                return entry[1]
+
+            obj = loader(path)
+            _object_cache[key] = (signature, obj)
+            logging.info("Loaded %s into the object cache", path)
+            return obj
 
     except Exception as e:
         raise CustomException(e, sys)
 
-def evaluate_models(X_train, y_train,X_test,y_test,models,param):
+def clear_object_cache():
+    with _object_cache_lock:
+        _object_cache.clear()
+
+def accepts_sparse_input(model):
+    try:
+        from sklearn.utils import get_tags
+        return get_tags(model).input_tags.sparse
+    except Exception:
+        # older sklearn or a non-sklearn model, densify to be safe
+        return False
+
+def as_model_input(model, X):
+    '''
+    Passes sparse features through untouched to models that take them and
+    densifies them only for the ones that do not.
+    '''
+    # X can only be sparse once scipy.sparse has been imported by someone
+    sparse = sys.modules.get("scipy.sparse")
+    if sparse is not None and sparse.issparse(X) and not accepts_sparse_input(model):
+        return X.toarray()
+    return X
+
+def resolve_worker_budget(n_jobs):
+    '''
+    Turns an n_jobs style value (-1 means all cores) into a concrete number of
+    workers, capped at the cores this machine actually has.
+    '''
+    cpu_count = os.cpu_count() or 1
+    if n_jobs is None or n_jobs == 0:
+        return 1
+    if n_jobs < 0:
+        return max(1, cpu_count + 1 + n_jobs)
+    if n_jobs > cpu_count:
+        logging.warning("Worker budget %s exceeds %s cores, capping it", n_jobs, cpu_count)
+        return cpu_count
+    return n_jobs
+
+def get_thread_params(model):
+    # CatBoost/XGBoost (and some sklearn models) start their own thread pools
+    params = model.get_params()
+    if type(model).__name__.startswith("CatBoost"):
+        # unset means CatBoost's default of all cores, and it rejects None
+        return {"thread_count": params.get("thread_count", -1)}
+    if "n_jobs" in params:
+        return {"n_jobs": params["n_jobs"]}
+    return {}
+
+def limit_model_threads(model, n_threads):
+    '''
+    Returns a copy of model with its thread pools pinned to n_threads, so
+    parallel searches stay within the worker budget while the caller's
+    estimator keeps its own settings.
+    '''
+    from sklearn.base import clone
+
+    return clone(model).set_params(**{name: n_threads for name in get_thread_params(model)})
+
+def restore_model_threads(model, original):
+    # the searched (and refit) estimator gets the thread settings it had
+    # before limit_model_threads, so they do not end up in model.pkl
+    thread_params = get_thread_params(original)
+    if not type(model).__name__.startswith("CatBoost") or not model.is_fitted():
+        return model.set_params(**thread_params)
+
+    # CatBoost refuses set_params once fitted. get_params reads the private
+    # _init_params, so the setting goes there, the way set_params stores it
+    # (-1, the default, is not stored)
+    init_params = getattr(model, "_init_params", None)
+    if not isinstance(init_params, dict):
+        logging.warning("Cannot restore the thread count of the fitted %s, it keeps %s",
+                        type(model).__name__, model.get_params().get("thread_count"))
+        return model
+    init_params.pop("thread_count", None)
+    if thread_params["thread_count"] != -1:
+        init_params["thread_count"] = thread_params["thread_count"]
+    return model
+
+SEARCH_STRATEGIES = ("grid", "halving", "random")
+
+def build_search(model, para, strategy="grid", cv_jobs=None, refit=True, n_iter=10, random_state=None,
+                 min_resources="exhaust"):
+    '''
+    Wraps a model in the search for the chosen strategy. Every strategy takes
+    the same param dictionaries: "grid" tries all combinations, "halving" races
+    them on growing subsets of the data (starting at min_resources rows) and
+    "random" samples n_iter of them.
+    '''
+    from sklearn.model_selection import GridSearchCV, RandomizedSearchCV
+
+    if strategy == "grid":
+        return GridSearchCV(model,para,cv=3,n_jobs=cv_jobs,refit=refit)
+
+    if strategy == "halving":
+        from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+        from sklearn.model_selection import HalvingGridSearchCV
+        return HalvingGridSearchCV(model,para,cv=3,n_jobs=cv_jobs,refit=refit,random_state=random_state,
+                                   min_resources=min_resources)
+
+    if strategy == "random":
+        return RandomizedSearchCV(model,para,n_iter=n_iter,cv=3,n_jobs=cv_jobs,refit=refit,
+                                  random_state=random_state)
+
+    raise ValueError(f"Unknown search strategy {strategy!r}, expected one of {SEARCH_STRATEGIES}")
+
+def budgeted_search(model, para, X_train, y_train, time_budget, cv_jobs=None, refit=True,
+                    n_iter=10, random_state=None):
+    '''
+    Randomized search bounded by wall-clock seconds as well as n_iter. Sampled
+    candidates are cross validated one after another until the time runs out;
+    the first candidate always runs so there is a result to return.
+    '''
+    from sklearn.base import clone
+    from sklearn.model_selection import ParameterSampler, cross_val_score
+
+    deadline = time.monotonic() + time_budget
+    best_params, best_score = None, -np.inf
+
+    for candidate in ParameterSampler(para, n_iter=n_iter, random_state=random_state):
+        if best_params is not None and time.monotonic() >= deadline:
+            logging.info("Time budget of %ss spent on %s", time_budget, type(model).__name__)
+            break
+
+        estimator = clone(model).set_params(**candidate)
+        score = cross_val_score(estimator, X_train, y_train, cv=3, n_jobs=cv_jobs).mean()
+        if score > best_score:
+            best_params, best_score = candidate, score
+
+    best_model = clone(model).set_params(**best_params)
+    if refit:
+        best_model.fit(X_train, y_train)
+
+    return best_model, best_score
+
+ENSEMBLE_SIZE_PARAMS = ("n_estimators", "iterations")
+
+def get_ensemble_size_param(model, para):
+    '''
+    Returns the ensemble size parameter swept by `para` when the model can be
+    scored at several sizes from a single growing fit, else None.
+    '''
+    for name in ENSEMBLE_SIZE_PARAMS:
+        if len(para.get(name, [])) < 2:
+            continue
+        if hasattr(model, "staged_predict") or hasattr(model, "get_booster"):
+            return name
+        if "warm_start" in model.get_params():
+            return name
+    return None
+
+def staged_fold_scores(estimator, size_param, sizes, X_fit, y_fit, X_val, y_val):
+    '''
+    Fits one ensemble of the largest size and scores it at every checkpoint in
+    `sizes` (ascending), so the sweep costs about as much as its largest model.
+    '''
+    from sklearn.ensemble import AdaBoostRegressor
+    from sklearn.metrics import r2_score
+
+    if isinstance(estimator, AdaBoostRegressor):
+        # AdaBoost's staged_predict recomputes the weighted median over every
+        # earlier stage, so only score truncated copies at the checkpoints
+        estimator.set_params(**{size_param: sizes[-1]}).fit(X_fit, y_fit)
+        scores = []
+        for size in sizes:
+            truncated = copy.copy(estimator)
+            truncated.estimators_ = estimator.estimators_[:size]
+            truncated.estimator_weights_ = estimator.estimator_weights_[:size]
+            scores.append(r2_score(y_val, truncated.predict(X_val)))
+        return scores
+
+    if hasattr(estimator, "staged_predict"):
+        # boosting: predictions after each stage come for free
+        estimator.set_params(**{size_param: sizes[-1]}).fit(X_fit, y_fit)
+        staged = {}
+        for stage, pred in enumerate(estimator.staged_predict(X_val), 1):
+            staged[stage] = pred
+        last_stage = max(staged)
+        # a booster that stopped early predicts the same for any larger size
+        return [r2_score(y_val, staged[min(size, last_stage)]) for size in sizes]
+
+    if hasattr(estimator, "get_booster"):
+        estimator.set_params(**{size_param: sizes[-1]}).fit(X_fit, y_fit)
+        return [r2_score(y_val, estimator.predict(X_val, iteration_range=(0, size))) for size in sizes]
+
+    # bagging: keep adding trees to the same forest
+    estimator.set_params(warm_start=True)
+    scores = []
+    for size in sizes:
+        estimator.set_params(**{size_param: size}).fit(X_fit, y_fit)
+        scores.append(r2_score(y_val, estimator.predict(X_val)))
+    return scores
+
+def staged_search(model, para, size_param, X_train, y_train, cv_jobs=None, refit=True):
+    '''
+    Exhaustive search equivalent to GridSearchCV(cv=3) that grows a single
+    ensemble per (candidate, fold) instead of training every size from scratch.
+    '''
+    from joblib import Parallel, delayed
+    from sklearn.base import clone
+    from sklearn.model_selection import ParameterGrid, KFold
+
+    sizes = sorted(para[size_param])
+    other_params = {name: values for name, values in para.items() if name != size_param}
+    candidates = list(ParameterGrid(other_params))
+    folds = list(KFold(n_splits=3).split(X_train))
+
+    fold_scores = Parallel(n_jobs=cv_jobs)(
+        delayed(staged_fold_scores)(
+            clone(model).set_params(**candidate), size_param, sizes,
+            X_train[fit_idx], y_train[fit_idx], X_train[val_idx], y_train[val_idx]
+        )
+        for candidate in candidates
+        for fit_idx, val_idx in folds
+    )
+
+    best_params, best_score = None, -np.inf
+    for i, candidate in enumerate(candidates):
+        mean_scores = np.mean(fold_scores[i * len(folds):(i + 1) * len(folds)], axis=0)
+        for size, score in zip(sizes, mean_scores):
+            if score > best_score:
+                best_params, best_score = dict(candidate, **{size_param: size}), score
+
+    best_model = clone(model).set_params(**best_params)
+    if refit:
+        best_model.fit(X_train, y_train)
+
+    return best_model, best_score
+
+def search_model(model, para, X_train, y_train, cv_jobs=None, refit=True, strategy="grid",
+                 n_iter=10, time_budget=None, random_state=None, min_resources=None,
+                 warm_start=False):
+    '''
+    Searches one model. With refit the search's own refit estimator is
+    returned, so the best candidate is fit on the full training set exactly
+    once; without it an unfitted model carrying the best params is returned
+    together with the best CV score.
+
+    With warm_start an exhaustive sweep over the ensemble size is done by
+    staged_search instead of fitting each size from scratch.
+    '''
+    size_param = get_ensemble_size_param(model, para) if warm_start and strategy == "grid" else None
+    if size_param is not None:
+        return staged_search(model, para, size_param, X_train, y_train, cv_jobs=cv_jobs, refit=refit)
+
+    if strategy == "random" and time_budget is not None:
+        return budgeted_search(model, para, X_train, y_train, time_budget, cv_jobs=cv_jobs,
+                               refit=refit, n_iter=n_iter, random_state=random_state)
+
+    if min_resources is None:
+        # halving from a handful of rows eliminates candidates on noise
+        min_resources = max(y_train.shape[0] // 4, 1)
+
+    gs = build_search(model, para, strategy=strategy, cv_jobs=cv_jobs, refit=refit,
+                      n_iter=n_iter, random_state=random_state, min_resources=min_resources)
+    gs.fit(X_train,y_train)
+
+    if refit:
+        return gs.best_estimator_, gs.best_score_
+
+    return model.set_params(**gs.best_params_), gs.best_score_
+
+def evaluate_models(X_train, y_train,X_test,y_test,models,param,n_jobs=1,refit=True,
+                    search_strategy="grid",n_iter=10,time_budget=None,random_state=None,
+                    min_resources=None,warm_start=False):
+    '''
+    Runs a hyperparameter search per model and reports its score. With
+    n_jobs > 1 whole model searches run concurrently in a process pool and the
+    cores left over are split across the CV folds of each search. The searched
+    estimators are written back into `models`.
+
+    With refit=False no final fit happens: the report holds the best CV score
+    of each model and the caller fits only the winner.
+
+    search_strategy is one of SEARCH_STRATEGIES. For "random", time_budget
+    bounds the whole run in seconds and is shared out evenly between models.
+    For "halving", min_resources defaults to a quarter of the training rows.
+    warm_start lets grid searches grow ensembles instead of refitting each size.
+    '''
+    from concurrent.futures import ProcessPoolExecutor
+    from sklearn.metrics import r2_score
+
     try:
         report = {}
 
-        for i in range(len(list(models))):
-            model = list(models.values())[i]
-            para=param[list(models.keys())[i]]
+        budget = resolve_worker_budget(n_jobs)
+        model_workers = min(budget, len(models))
+        cv_jobs = max(1, budget // model_workers)
+
+        search_kwargs = {
+            "refit": refit,
+            "strategy": search_strategy,
+            "n_iter": n_iter,
+            "random_state": random_state,
+            "min_resources": min_resources,
+            "warm_start": warm_start,
+            # models searched side by side each get their share of the run
+            "time_budget": None if time_budget is None else time_budget * model_workers / len(models),
+        }
 
-            gs = GridSearchCV(model,para,cv=3)
-            gs.fit(X_train,y_train)
+        searched_models = models
+        if budget > 1:
+            logging.info("Searching %s models with %s workers x %s CV jobs", len(models), model_workers, cv_jobs)
+            searched_models = {name: limit_model_threads(model, 1) for name, model in models.items()}
 
-            model.set_params(**gs.best_params_)
-            model.fit(X_train,y_train)
+        if model_workers > 1:
+            with ProcessPoolExecutor(max_workers=model_workers) as executor:
+                futures = {
+                    name: executor.submit(search_model, model, param[name], as_model_input(model, X_train), y_train,
+                                          cv_jobs, **search_kwargs)
+                    for name, model in searched_models.items()
+                }
+                # the searched copies come back from the worker processes
+                results = {name: future.result() for name, future in futures.items()}
+        else:
+            results = {
+                name: search_model(model, param[name], as_model_input(model, X_train), y_train, cv_jobs,
+                                   **search_kwargs)
+                for name, model in searched_models.items()
+            }
 
-            model.fit(X_train, y_train)  # Train model
+        for name, (model, cv_score) in results.items():
+            models[name] = restore_model_threads(model, models[name])
+
+        if not refit:
+            return {name: cv_score for name, (model, cv_score) in results.items()}
+
+        for i in range(len(list(models))):
+            model = list(models.values())[i]
 
-            y_train_pred = model.predict(X_train)
+            y_train_pred = model.predict(as_model_input(model, X_train))
 
-            y_test_pred = model.predict(X_test)
+            y_test_pred = model.predict(as_model_input(model, X_test))
 
             train_model_score = r2_score(y_train, y_train_pred)
 
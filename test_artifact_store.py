@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+Tests for the serving artifact store
+"""
+
+import os
+
+from src.ENDTOENDDSPROJECT import utils
+from src.ENDTOENDDSPROJECT.components.artifact_store import ArtifactStore
+from src.ENDTOENDDSPROJECT.pipelines.prediction_pipeline import PredictPipeline
+
+def test_pipelines_share_the_cached_bundle(tmp_path, monkeypatch):
+    """Every PredictPipeline reads the current bundle through one cache entry"""
+    monkeypatch.chdir(tmp_path)
+    for name in ("model", "preprocessor"):
+        with open(f"{name}.pkl", "wb") as file_obj:
+            file_obj.write(name.encode())
+    ArtifactStore().publish({"model": "model.pkl", "preprocessor": "preprocessor.pkl"})
+
+    pointer_path = os.path.abspath(ArtifactStore().pointer_path)
+    paths = [PredictPipeline().get_artifact_paths() for _ in range(3)]
+
+    assert paths[0] == paths[1] == paths[2]
+    assert sum(key[0] == pointer_path for key in utils._object_cache) == 1
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Tests for streaming SQL ingestion over a connection pool
+"""
+
+import os
+import sqlite3
+import uuid
+
+import pandas as pd
+
+from src.ENDTOENDDSPROJECT.components.data_ingestion import DataIngestion
+from src.ENDTOENDDSPROJECT.utils import ConnectionPool, read_dataset
+
+def make_table(rows):
+    """Shared in-memory SQLite database, alive while the returned connection is open"""
+    uri = f"file:ingestion_{uuid.uuid4().hex}?mode=memory&cache=shared"
+    keeper = sqlite3.connect(uri, uri=True)
+    rows.to_sql("students", keeper, index=False)
+    pool = ConnectionPool(lambda: sqlite3.connect(uri, uri=True, check_same_thread=False), paramstyle="qmark")
+    return keeper, pool
+
+def ingest(rows, directory):
+    keeper, pool = make_table(rows)
+    try:
+        data_ingestion = DataIngestion(connection_pool=pool)
+        config = data_ingestion.ingestion_config
+        config.source = "sql"
+        config.incremental = False
+        config.sql_chunk_size = 7
+        for name in ("train_data_path", "test_data_path", "raw_data_path", "watermark_path"):
+            setattr(config, name, os.path.join(directory, os.path.basename(getattr(config, name))))
+        data_ingestion.initiate_data_ingestion()
+        return read_dataset(config.raw_data_path), read_dataset(config.train_data_path), \
+            read_dataset(config.test_data_path)
+    finally:
+        pool.close()
+        keeper.close()
+
+def test_sql_ingestion_streams_a_reproducible_split(tmp_path):
+    """Every row lands in exactly one split, whatever order the table returns them in"""
+    rows = pd.DataFrame({"id": range(50), "District": [f"d{i % 4}" for i in range(50)],
+                         "pH Level": [6 + i / 50 for i in range(50)]})
+
+    raw, train, test = ingest(rows, str(tmp_path / "first"))
+    _, _, reversed_test = ingest(rows.iloc[::-1], str(tmp_path / "second"))
+
+    assert len(raw) == 50
+    assert sorted(train["id"].tolist() + test["id"].tolist()) == list(range(50))
+    assert 0 < len(test) < 50
+    assert sorted(test["id"]) == sorted(reversed_test["id"])
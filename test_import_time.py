@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Import-time budget for the serving side of the project
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+SERVING_MODULE = "src.ENDTOENDDSPROJECT.pipelines.prediction_pipeline"
+
+# training-only dependencies a serving worker must not pay for at startup
+TRAINING_ONLY_MODULES = ["sklearn", "scipy", "joblib", "pymysql", "dotenv", "mlflow", "xgboost", "catboost"]
+
+# seconds, override on slow machines
+IMPORT_TIME_BUDGET = float(os.getenv("IMPORT_TIME_BUDGET", 1.5))
+
+def measure_import(module):
+    """Import the module in a fresh interpreter, return its import time and loaded modules"""
+    code = (
+        "import json, sys, time\n"
+        "started = time.perf_counter()\n"
+        f"import {module}\n"
+        "print(json.dumps({'seconds': time.perf_counter() - started, 'modules': sorted(sys.modules)}))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def test_serving_imports_skip_training_dependencies():
+    modules = measure_import(SERVING_MODULE)["modules"]
+    loaded = sorted({name.split(".")[0] for name in modules} & set(TRAINING_ONLY_MODULES))
+    assert not loaded, f"{SERVING_MODULE} imports training-only modules: {loaded}"
+
+def test_serving_import_time_budget():
+    # best of three, so one slow run on a busy machine does not fail the build
+    seconds = min(measure_import(SERVING_MODULE)["seconds"] for _ in range(3))
+    print(f"{SERVING_MODULE} imports in {seconds:.3f}s (budget {IMPORT_TIME_BUDGET}s)")
+    assert seconds <= IMPORT_TIME_BUDGET
+
+if __name__ == "__main__":
+    test_serving_imports_skip_training_dependencies()
+    test_serving_import_time_budget()
+    print("✅ Import time within budget")
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Tests for the thread limits of parallel model searches
+"""
+
+import numpy as np
+from catboost import CatBoostRegressor
+from sklearn.ensemble import RandomForestRegressor
+
+from src.ENDTOENDDSPROJECT import utils
+from src.ENDTOENDDSPROJECT.utils import evaluate_models, load_object, save_object
+
+def test_saved_models_keep_their_thread_settings(tmp_path, monkeypatch):
+    """Searched models are pinned to one thread, the saved ones report the original settings"""
+    # a worker budget above one, whatever this machine has
+    monkeypatch.setattr(utils.os, "cpu_count", lambda: 4)
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(60, 3))
+    y = X @ np.array([1.0, -2.0, 0.5])
+    models = {
+        "Random Forest": RandomForestRegressor(n_estimators=5, n_jobs=3),
+        "CatBoost": CatBoostRegressor(iterations=5, thread_count=3, verbose=False, allow_writing_files=False),
+        "CatBoost default": CatBoostRegressor(iterations=5, verbose=False, allow_writing_files=False),
+    }
+    params = {"Random Forest": {"max_depth": [2]}, "CatBoost": {"depth": [2]}, "CatBoost default": {"depth": [2]}}
+
+    evaluate_models(X, y, X, y, models, params, n_jobs=2)
+
+    saved = {}
+    for name, model in models.items():
+        save_object(str(tmp_path / f"{name}.pkl"), model)
+        saved[name] = load_object(str(tmp_path / f"{name}.pkl"))
+
+    assert saved["Random Forest"].get_params()["n_jobs"] == 3
+    assert saved["CatBoost"].get_params()["thread_count"] == 3
+    assert "thread_count" not in saved["CatBoost default"].get_params()
+    assert saved["CatBoost"].is_fitted()
+    assert np.isfinite(saved["CatBoost"].predict(X)).all()